@@ -1,22 +1,22 @@
 from copy import deepcopy
 from flask_login import current_user
-from ipaddress import IPv4Network
 from json import loads
 from logging import info
 from ldap3 import Connection, NTLM, SUBTREE
 from os import listdir, makedirs
 from os.path import exists
 from pathlib import Path
+from pickle import loads as pickle_loads
 from shutil import rmtree
-from requests import get as http_get
 from ruamel import yaml
+from sqlalchemy import LargeBinary, select, type_coerce
 from tarfile import open as open_tar
 from traceback import format_exc
 
 from eNMS.controller.base import BaseController
 from eNMS.database import Session
 from eNMS.database.functions import delete_all, export, factory, fetch, fetch_all
-from eNMS.models import relationships
+from eNMS.models import models, relationships
 
 
 class AdministrationController(BaseController):
@@ -64,6 +64,38 @@ class AdministrationController(BaseController):
     def get_user_credentials(self):
         return (current_user.name, current_user.password)
 
+    def convert_pickled_payloads(self, batch_size=1000):
+        converted_rows = 0
+        for model, properties in (
+            ("result", ("result", "logs")),
+            ("run", ("properties", "state")),
+        ):
+            table, last_id = models[model].__table__, 0
+            columns = [type_coerce(table.c[prop], LargeBinary) for prop in properties]
+            while True:
+                rows = Session.execute(
+                    select([table.c.id, *columns])
+                    .where(table.c.id > last_id)
+                    .order_by(table.c.id)
+                    .limit(batch_size)
+                ).fetchall()
+                if not rows:
+                    break
+                for id, *values in rows:
+                    payloads = {
+                        property: pickle_loads(value)
+                        for property, value in zip(properties, values)
+                        if value and value[:1] == b"\x80"
+                    }
+                    if payloads:
+                        Session.execute(
+                            table.update().where(table.c.id == id).values(**payloads)
+                        )
+                        converted_rows += 1
+                Session.commit()
+                last_id = rows[-1][0]
+        return converted_rows
+
     def database_deletion(self, **kwargs):
         delete_all(*kwargs["deletion_types"])
 
@@ -73,6 +105,9 @@ class AdministrationController(BaseController):
             for attr in ("status", "cpu_load")
         }
 
+    def get_connection_pool_metrics(self):
+        return self.connection_pool.metrics
+
     def objectify(self, model, obj):
         for property, relation in relationships[model].items():
             if property not in obj:
@@ -186,15 +221,4 @@ class AdministrationController(BaseController):
         self.config = config
 
     def scan_cluster(self, **kwargs):
-        protocol = self.config["cluster"]["scan_protocol"]
-        for ip_address in IPv4Network(self.config["cluster"]["scan_subnet"]):
-            try:
-                server = http_get(
-                    f"{protocol}://{ip_address}/rest/is_alive",
-                    timeout=self.config["cluster"]["scan_timeout"],
-                ).json()
-                if self.config["cluster"]["id"] != server.pop("cluster_id"):
-                    continue
-                factory("server", **{**server, **{"ip_address": str(ip_address)}})
-            except ConnectionError:
-                continue
+        return self.cluster.scan()
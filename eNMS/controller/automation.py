@@ -1,5 +1,4 @@
 from apscheduler.jobstores.base import JobLookupError
-from collections import defaultdict
 from datetime import datetime
 from flask import request, session
 from flask_login import current_user
@@ -8,11 +7,13 @@ from netmiko.ssh_dispatcher import CLASS_MAPPER, FILE_TRANSFER_MAP
 from operator import itemgetter
 from pathlib import Path
 from re import search, sub
+from time import time
 from uuid import uuid4
 
 from eNMS.controller.base import BaseController
 from eNMS.database import Session
 from eNMS.database.functions import delete, factory, fetch, fetch_all, objectify
+from eNMS.models import models
 
 
 class AutomationController(BaseController):
@@ -20,15 +21,12 @@ class AutomationController(BaseController):
     NETMIKO_DRIVERS = sorted((driver, driver) for driver in CLASS_MAPPER)
     NETMIKO_SCP_DRIVERS = sorted((driver, driver) for driver in FILE_TRANSFER_MAP)
     NAPALM_DRIVERS = sorted((driver, driver) for driver in SUPPORTED_DRIVERS[1:])
-    connections_cache = {"napalm": defaultdict(dict), "netmiko": defaultdict(dict)}
-    service_db = defaultdict(lambda: {"runs": 0})
-    run_db = defaultdict(dict)
-    run_logs = defaultdict(list)
+    workflow_plans = {}
 
     def stop_workflow(self, runtime):
         run = fetch("run", allow_none=True, runtime=runtime)
-        if run and run.run_state["status"] == "Running":
-            run.run_state["status"] = "stop"
+        if run and run.run_state.get("status") == "Running":
+            run.set_state(("status",), "stop")
             return True
 
     def add_edge(self, workflow_id, subtype, source, destination):
@@ -78,10 +76,8 @@ class AutomationController(BaseController):
         }
 
     def clear_results(self, service_id):
-        for result in fetch(
-            "run", all_matches=True, allow_none=True, service_id=service_id
-        ):
-            Session.delete(result)
+        runs = Session.query(models["run"].id).filter_by(service_id=service_id)
+        self.result_retention.delete_runs([run_id for run_id, in runs])
 
     def create_label(self, workflow_id, x, y, **kwargs):
         workflow, label_id = fetch("workflow", id=workflow_id), str(uuid4())
@@ -122,18 +118,104 @@ class AutomationController(BaseController):
         workflow = fetch("workflow", id=workflow_id)
         return workflow.duplicate().serialized
 
-    def get_service_logs(self, service, runtime):
-        run = fetch("run", allow_none=True, parent_runtime=runtime, service_id=service)
-        result = run.result() if run else None
-        logs = result["logs"] if result else self.run_logs.get(runtime, [])
-        return {"logs": "\n".join(logs), "refresh": not bool(result)}
+    def get_stored_logs(self, service, runtime):
+        result_model, run = models["result"], models["run"]
+        result = (
+            Session.query(result_model.id, result_model.logs)
+            .join(run, result_model.run_id == run.id)
+            .filter(
+                run.parent_runtime == runtime,
+                run.service_id == int(service),
+                result_model.device_id.is_(None),
+            )
+            .order_by(result_model.id.desc())
+            .first()
+        )
+        if not result:
+            return None
+        elif result.logs is None:
+            return fetch("result", id=result.id).result.get("logs", [])
+        else:
+            return result.logs
+
+    def get_service_logs(self, service, runtime, offset=0):
+        offset, logs = int(offset), self.get_stored_logs(service, runtime)
+        refresh = logs is None
+        logs = self.run_logs.read(runtime, offset) if refresh else logs[offset:]
+        return {
+            "logs": "\n".join(logs),
+            "offset": offset + len(logs),
+            "refresh": refresh,
+        }
+
+    def stream_run_state(self, service_id, runtime="latest", offset=0):
+        if runtime == "latest":
+            run_model = models["run"]
+            run = (
+                Session.query(run_model.parent_runtime)
+                .filter_by(service_id=service_id)
+                .order_by(run_model.id.desc())
+                .first()
+            )
+            Session.remove()
+            if not run:
+                yield self.run_stream.event("end", None)
+                return
+            runtime = run.parent_runtime
+        streaming = self.run_stream.streams.acquire(blocking=False)
+        try:
+            events = self.run_state_events(service_id, runtime, int(offset), streaming)
+            yield from events
+        finally:
+            if streaming:
+                self.run_stream.streams.release()
+
+    def run_state_events(self, service_id, runtime, offset, streaming):
+        sent_state, version = {}, self.run_stream.version
+        found, last_event = False, time()
+        yield self.run_stream.event("runtime", runtime)
+        while True:
+            state, stored_logs, run = self.run_store.get(runtime), None, None
+            if state is None:
+                run = fetch("run", allow_none=True, runtime=runtime)
+                if run and run.state:
+                    state = run.state
+                    stored_logs = self.get_stored_logs(service_id, runtime)
+                Session.remove()
+            if stored_logs is None:
+                logs = self.run_logs.read(runtime, offset)
+            else:
+                logs = stored_logs[offset:]
+            delta = self.run_stream.delta(sent_state, state) if state else None
+            if delta:
+                yield self.run_stream.event("state", delta)
+            if logs:
+                offset += len(logs)
+                yield self.run_stream.event("logs", logs, offset)
+            if delta or logs:
+                last_event = time()
+            if state is None and run is None:
+                ended = found
+            else:
+                found, ended = True, stored_logs is not None
+                ended = ended or run is not None and run.status != "Running"
+            if ended or time() - last_event > self.run_stream.max_idle:
+                yield self.run_stream.event("end", runtime)
+                return
+            if not streaming:
+                yield self.run_stream.retry()
+                return
+            new_version = self.run_stream.wait(version)
+            if new_version == version:
+                yield ": heartbeat\n\n"
+            version = new_version
 
     def get_runtimes(self, type, id):
         runs = fetch("run", allow_none=True, all_matches=True, service_id=id)
         return sorted(set((run.parent_runtime, run.name) for run in runs))
 
     def get_result(self, id):
-        return fetch("result", id=id).result
+        return fetch("result", id=id).result_with_logs
 
     def get_top_level_workflows(self):
         return [
@@ -275,6 +357,9 @@ class AutomationController(BaseController):
         run.properties = kwargs
         return run.run(kwargs.get("payload"))
 
+    def run_shard(self, run_id, devices, payload=None):
+        return fetch("run", id=run_id).run_shard(payload or {}, devices)
+
     def run_service(self, id=None, **kwargs):
         for property in ("user", "csrf_token", "form_type"):
             kwargs.pop(property, None)
@@ -282,18 +367,22 @@ class AutomationController(BaseController):
         service = fetch("service", id=id)
         kwargs["runtime"] = runtime = self.get_time()
         if kwargs.get("asynchronous", True):
-            self.scheduler.add_job(
-                id=self.get_time(),
-                func=self.run,
-                run_date=datetime.now(),
-                args=[id],
-                kwargs=kwargs,
-                trigger="date",
-            )
+            self.schedule_run(id, **kwargs)
         else:
             service.run(runtime=runtime)
         return {"service": service.serialized, "runtime": runtime}
 
+    def schedule_run(self, service_id, **kwargs):
+        self.scheduler.add_job(
+            id=str(uuid4()),
+            func=self.run,
+            run_date=datetime.now(),
+            args=[service_id],
+            kwargs=kwargs,
+            trigger="date",
+            misfire_grace_time=None,
+        )
+
     def save_positions(self, workflow_id):
         now, old_position = self.get_time(), None
         workflow = fetch("workflow", allow_none=True, id=workflow_id)
@@ -325,7 +414,7 @@ class AutomationController(BaseController):
         if runs and runtime != "normal":
             if runtime == "latest":
                 runtime = runs[-1].parent_runtime
-            state = self.run_db.get(runtime) or fetch("run", runtime=runtime).state
+            state = self.run_store.get(runtime) or fetch("run", runtime=runtime).state
         return {
             "service": service.to_dict(include=["services", "edges"]),
             "runtimes": [(r.parent_runtime, r.creator) for r in runs],
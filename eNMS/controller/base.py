@@ -1,17 +1,17 @@
 from apscheduler.schedulers.background import BackgroundScheduler
-from collections import Counter
+from collections import Counter, defaultdict
 from datetime import datetime
-from difflib import SequenceMatcher
 from email.mime.application import MIMEApplication
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.utils import formatdate
+from fcntl import flock, LOCK_EX, LOCK_NB
 from flask_login import current_user
 from git import Repo
 from hvac import Client as VaultClient
 from importlib import import_module
 from importlib.util import module_from_spec, spec_from_file_location
-from json import load
+from json import dumps, load
 from ldap3 import ALL, Server
 from logging import basicConfig, error, info, StreamHandler, warning
 from logging.handlers import RotatingFileHandler
@@ -24,9 +24,9 @@ from requests.packages.urllib3.util.retry import Retry
 from ruamel import yaml
 from smtplib import SMTP
 from string import punctuation
-from sqlalchemy import and_, func, or_
+from sqlalchemy import and_, func, inspect, or_
 from sqlalchemy.exc import IntegrityError, InvalidRequestError
-from sqlalchemy.orm import configure_mappers
+from sqlalchemy.orm import configure_mappers, joinedload
 from sys import path as sys_path
 from tacacs_plus.client import TACACSClient
 from uuid import getnode
@@ -55,12 +55,31 @@ from eNMS.properties.objects import (
     device_properties,
     pool_device_properties,
 )
+from eNMS.controller.cluster import Cluster
+from eNMS.controller.configurations import ConfigurationHistory, line_opcodes
+from eNMS.controller.connections import ConnectionPool
+from eNMS.controller.exports import TopologyExport
+from eNMS.controller.logs import RunLogs, SharedRunLogs
+from eNMS.controller.pools import PoolIndex
+from eNMS.controller.results import BatchWriter
+from eNMS.controller.retention import ResultRetention
+from eNMS.controller.states import (
+    CacheGenerations,
+    RunStore,
+    SQLiteRunStore,
+    wakeup,
+)
+from eNMS.controller.streams import RunStream
+from eNMS.controller.sync import InventorySync
 from eNMS.controller.syslog import SyslogServer
+from eNMS.controller.vault import SecretCache
 
 
 class BaseController:
 
     log_severity = {"error": error, "info": info, "warning": warning}
+    table_counts = defaultdict(dict)
+    table_cursors = defaultdict(dict)
 
     get_endpoints = [
         "/administration",
@@ -96,6 +115,7 @@ class BaseController:
         "clear_results",
         "clear_configurations",
         "compare",
+        "compare_configurations",
         "connection",
         "counters",
         "count_models",
@@ -110,7 +130,10 @@ class BaseController:
         "export_topology",
         "get",
         "get_all",
+        "get_changed_devices",
         "get_cluster_status",
+        "get_configuration_history",
+        "get_connection_pool_metrics",
         "get_device_network_data",
         "get_device_logs",
         "get_exported_services",
@@ -152,6 +175,9 @@ class BaseController:
     rest_endpoints = [
         "get_cluster_status",
         "get_git_content",
+        "query_librenms",
+        "query_netbox",
+        "query_opennms",
         "update_all_pools",
         "update_database_configurations_from_git",
     ]
@@ -160,6 +186,7 @@ class BaseController:
         self.config = config
         self.path = Path.cwd()
         self.custom_properties = self.load_custom_properties()
+        self.init_run_store()
         self.init_scheduler()
         if config["tacacs"]["active"]:
             self.init_tacacs_client()
@@ -174,6 +201,18 @@ class BaseController:
         self.fetch_version()
         self.init_logs()
         self.init_connection_pools()
+        self.cluster = Cluster(self.request_session, **self.config["cluster"])
+        self.inventory_sync = InventorySync(
+            self.request_session, **self.config["inventory_sync"]
+        )
+        self.init_result_writer()
+        self.result_retention = ResultRetention(**self.config["result_retention"])
+        self.run_stream = RunStream(**self.config["run_stream"])
+        self.topology_export = TopologyExport(**self.config["topology_export"])
+        self.pool_index = PoolIndex(self.cache_generations)
+        self.configuration_history = ConfigurationHistory(
+            **self.config["configuration_history"]
+        )
 
     def configure_database(self):
         self.init_services()
@@ -182,6 +221,8 @@ class BaseController:
         configure_events(self)
         self.init_forms()
         self.clean_database()
+        self.schedule_result_retention()
+        self.schedule_wakeup()
         if not fetch("user", allow_none=True, name="admin"):
             self.configure_server_id()
             self.create_admin_user()
@@ -291,8 +332,72 @@ class BaseController:
                 f"{protocol}://",
                 HTTPAdapter(max_retries=retry, **self.config["requests"]["pool"],),
             )
+        self.connection_pool = ConnectionPool(**self.config["connection_pool"])
+
+    def after_fork(self):
+        for component in (
+            self.run_store,
+            self.run_stream,
+            self.connection_pool,
+            self.result_writer,
+        ):
+            component.after_fork()
+        if self.config["vault"]["active"]:
+            self.vault_cache.after_fork()
+        if self.config["syslog"]["active"]:
+            self.syslog_server.matcher.after_fork()
+        self.run_logs = RunLogs(self.path / "logs" / "runs", **self.config["run_logs"])
+
+    def init_result_writer(self):
+        self.result_writer = BatchWriter("result", **self.config["results"])
+
+    def init_run_store(self):
+        settings = self.config["run_state"]
+        if settings["backend"] == "sqlite":
+            self.run_store = SQLiteRunStore(self.path / settings["path"])
+            self.run_logs = SharedRunLogs(self.run_store)
+        else:
+            self.run_store = RunStore()
+            self.run_logs = RunLogs(
+                self.path / "logs" / "runs", **self.config["run_logs"]
+            )
+        self.cache_generations = CacheGenerations(self.run_store)
+
+    def scheduler_leader(self):
+        if self.config["run_state"]["backend"] == "memory":
+            return True
+        self.scheduler_lock = open(self.path / "scheduler.lock", "w")
+        try:
+            flock(self.scheduler_lock, LOCK_EX | LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def schedule_wakeup(self):
+        if self.config["run_state"]["backend"] == "memory":
+            return
+        self.scheduler.add_job(
+            id="scheduler_wakeup",
+            func=wakeup,
+            trigger="interval",
+            seconds=self.config["run_state"]["scheduler_interval"],
+            replace_existing=True,
+        )
+
+    def schedule_result_retention(self):
+        if self.result_retention.active:
+            self.scheduler.add_job(
+                id="result_retention",
+                func=self.result_retention.apply,
+                trigger="interval",
+                seconds=self.result_retention.interval,
+                replace_existing=True,
+            )
 
     def init_scheduler(self):
+        misfire_grace_time = 5
+        if self.config["run_state"]["backend"] == "sqlite":
+            misfire_grace_time += self.config["run_state"]["scheduler_interval"]
         self.scheduler = BackgroundScheduler(
             {
                 "apscheduler.jobstores.default": {
@@ -303,13 +408,13 @@ class BaseController:
                     "class": "apscheduler.executors.pool:ThreadPoolExecutor",
                     "max_workers": "50",
                 },
-                "apscheduler.job_defaults.misfire_grace_time": "5",
+                "apscheduler.job_defaults.misfire_grace_time": str(misfire_grace_time),
                 "apscheduler.job_defaults.coalesce": "true",
                 "apscheduler.job_defaults.max_instances": "3",
             }
         )
 
-        self.scheduler.start()
+        self.scheduler.start(paused=not self.scheduler_leader())
 
     def init_forms(self):
         for file in (self.path / "eNMS" / "forms").glob("**/*.py"):
@@ -349,10 +454,27 @@ class BaseController:
         if self.vault_client.sys.is_sealed() and self.config["vault"]["unseal"]:
             keys = [environ.get(f"UNSEAL_VAULT_KEY{i}") for i in range(1, 6)]
             self.vault_client.sys.submit_unseal_keys(filter(None, keys))
+        self.vault_cache = SecretCache(
+            self.vault_client,
+            self.config["vault"]["cache_ttl"],
+            self.config["vault"]["prefetch_workers"],
+            self.cache_generations,
+        )
 
     def init_syslog_server(self):
+        syslog = self.config["syslog"]
+        if syslog["store_logs"]:
+            self.log_writer = BatchWriter(
+                "log", syslog["batch_size"], syslog["flush_interval"]
+            )
         self.syslog_server = SyslogServer(
-            self.config["syslog"]["address"], self.config["syslog"]["port"]
+            syslog["address"],
+            syslog["port"],
+            syslog["queue_size"],
+            syslog["workers"],
+            self.schedule_run,
+            self.cache_generations,
+            self.log_writer if syslog["store_logs"] else None,
         )
         self.syslog_server.start()
 
@@ -410,18 +532,27 @@ class BaseController:
                 instance_type: count(instance_type) for instance_type in diagram_classes
             },
             "properties": {
-                instance_type: Counter(
-                    str(getattr(instance, type_to_diagram_properties[instance_type][0]))
-                    for instance in fetch_all(instance_type)
+                instance_type: self.property_counts(
+                    instance_type, type_to_diagram_properties[instance_type][0]
                 )
                 for instance_type in diagram_classes
             },
         }
 
+    def property_counts(self, instance_type, property):
+        model, counts = models[instance_type], Counter()
+        if property not in inspect(model).column_attrs:
+            instances = fetch_all(instance_type)
+            return Counter(str(getattr(instance, property)) for instance in instances)
+        column = getattr(model, property)
+        for value, number in Session.query(column, func.count()).group_by(column):
+            counts[str(value)] += number
+        return counts
+
     def compare(self, type, result1, result2):
         first = self.str_dict(getattr(fetch(type, id=result1), "result")).splitlines()
         second = self.str_dict(getattr(fetch(type, id=result2), "result")).splitlines()
-        opcodes = SequenceMatcher(None, first, second).get_opcodes()
+        opcodes = line_opcodes(first, second)
         return {"first": first, "second": second, "opcodes": opcodes}
 
     def build_filtering_constraints(self, obj_type, **kwargs):
@@ -479,11 +610,10 @@ class BaseController:
         model, properties = models[table], table_properties[table]
         operator = and_ if kwargs["form"].get("operator", "all") == "all" else or_
         column_index = int(kwargs["order"][0]["column"])
+        order_property, direction = None, kwargs["order"][0]["dir"]
         if column_index < len(properties):
-            order_property = getattr(model, properties[column_index])
-            order_function = getattr(order_property, kwargs["order"][0]["dir"], None)
-        else:
-            order_function = None
+            if properties[column_index] in inspect(model).column_attrs:
+                order_property = getattr(model, properties[column_index])
         constraints = self.build_filtering_constraints(table, **kwargs)
         if table == "result":
             constraints.append(
@@ -505,20 +635,106 @@ class BaseController:
         if table == "run":
             constraints.append(models["run"].children.any())
         result = Session.query(model).filter(operator(*constraints))
-        if order_function:
-            result = result.order_by(order_function())
+        filtering_key = dumps(
+            [kwargs["form"], kwargs.get("instance"), kwargs.get("runtime")],
+            sort_keys=True,
+        )
+        if self.cache_generations.stale(("table", table)):
+            self.table_counts[table], self.table_cursors[table] = {}, {}
+        counts = self.table_counts[table]
+        if None not in counts:
+            counts[None] = Session.query(func.count(model.id)).scalar()
+        if filtering_key not in counts:
+            counts[filtering_key] = get_query_count(result)
+        if order_property is None:
+            direction = "asc"
+        else:
+            not_null = order_property.isnot(None)
+            result = result.order_by(
+                not_null if direction == "asc" else not_null.desc(),
+                getattr(order_property, direction)(),
+            )
+        start, length = int(kwargs["start"]), int(kwargs["length"])
+        cursors = self.table_cursors[table]
+        cursor_key = (filtering_key, str(order_property), direction)
+        cursor = cursors.get((*cursor_key, start))
+        result = result.order_by(getattr(model.id, direction)())
+        if cursor:
+            result = result.filter(
+                self.keyset_constraint(model, order_property, direction, *cursor)
+            )
+        else:
+            result = result.offset(start)
+        rows = (
+            result.options(*self.table_loading_options(model, properties))
+            .limit(length)
+            .all()
+        )
+        if len(rows) == length > 0:
+            if len(cursors) > 1000:
+                cursors.clear()
+            last_row, order_value = rows[-1], None
+            if order_property is not None:
+                order_value = getattr(last_row, order_property.key)
+            cursors[(*cursor_key, start + length)] = (order_value, last_row.id)
         return {
             "draw": int(kwargs["draw"]),
-            "recordsTotal": Session.query(func.count(model.id)).scalar(),
-            "recordsFiltered": get_query_count(result),
-            "data": [
-                obj.generate_row()
-                for obj in result.limit(int(kwargs["length"]))
-                .offset(int(kwargs["start"]))
-                .all()
-            ],
+            "recordsTotal": counts[None],
+            "recordsFiltered": counts[filtering_key],
+            "data": [obj.generate_row() for obj in rows],
         }
 
+    @staticmethod
+    def keyset_constraint(model, order_property, direction, value, last_id):
+        ascending = direction == "asc"
+        after_id = model.id > last_id if ascending else model.id < last_id
+        if order_property is None:
+            return after_id
+        elif value is None:
+            constraint = and_(order_property.is_(None), after_id)
+            if ascending:
+                constraint = or_(constraint, order_property.isnot(None))
+            return constraint
+        if ascending:
+            after_value = order_property > value
+        else:
+            after_value = or_(order_property < value, order_property.is_(None))
+        return or_(after_value, and_(order_property == value, after_id))
+
+    @staticmethod
+    def table_loading_options(model, properties):
+        relations = inspect(model).relationships
+        return [
+            joinedload(getattr(model, property[:-5]))
+            for property in properties
+            if property.endswith("_name") and property[:-5] in relations
+        ]
+
+    def invalidate_table_cache(self, changed_tables=None):
+        invalidated = []
+        for table, model in models.items():
+            if table not in table_properties:
+                continue
+            if changed_tables is None:
+                update = False
+            else:
+                updates = [
+                    changed_tables[mapped.name]
+                    for mapped in model.__mapper__.tables
+                    if mapped.name in changed_tables
+                ]
+                if not updates:
+                    continue
+                update = all(updates)
+            counts = self.table_counts[table]
+            if update and None in counts:
+                self.table_counts[table] = {None: counts[None]}
+            else:
+                self.table_counts[table] = {}
+            self.table_cursors[table] = {}
+            invalidated.append(table)
+        return invalidated
+
     def allowed_file(self, name, allowed_modules):
         allowed_syntax = "." in name
         allowed_extension = name.rsplit(".", 1)[1].lower() in allowed_modules
@@ -588,7 +804,10 @@ class BaseController:
                     if not filepath.exists():
                         continue
                     with open(filepath) as file:
-                        setattr(device, data, file.read())
+                        content = file.read()
+                    runtime = datetime.now()
+                    if self.configuration_history.store(device, data, content, runtime):
+                        setattr(device, data, content)
         Session.commit()
         for pool in fetch_all("pool"):
             if pool.device_configuration or pool.device_operational_data:
@@ -0,0 +1,146 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from ipaddress import IPv4Network
+from itertools import islice
+from json import dumps
+from psutil import cpu_percent
+from requests.exceptions import ConnectionError, ConnectTimeout
+from urllib3.exceptions import NewConnectionError
+from uuid import getnode
+
+from eNMS.database import Session
+from eNMS.database.functions import factory
+from eNMS.models import models
+
+
+class Cluster:
+    def __init__(
+        self,
+        session,
+        active,
+        id,
+        scan_subnet,
+        scan_protocol,
+        scan_timeout,
+        scan_workers,
+        heartbeat_timeout,
+        shard_timeout,
+    ):
+        self.session = session
+        self.active = active
+        self.id = id
+        self.scan_subnet = scan_subnet
+        self.protocol = scan_protocol
+        self.scan_timeout = scan_timeout
+        self.scan_workers = scan_workers
+        self.heartbeat_timeout = heartbeat_timeout
+        self.shard_timeout = shard_timeout
+        self.name = str(getnode())
+
+    def url(self, address, endpoint):
+        return f"{self.protocol}://{address}/rest/{endpoint}"
+
+    def heartbeat(self, address, timeout=None):
+        try:
+            response = self.session.get(
+                self.url(address, "is_alive"), timeout=timeout or self.heartbeat_timeout
+            ).json()
+        except Exception:
+            return None
+        if response.pop("cluster_id", None) != self.id:
+            return None
+        return {**response, "name": str(response["name"])}
+
+    def poll(self, addresses, timeout=None):
+        addresses, pending = iter(addresses), {}
+        with ThreadPoolExecutor(self.scan_workers) as executor:
+            while True:
+                for address in islice(addresses, 2 * self.scan_workers - len(pending)):
+                    pending[executor.submit(self.heartbeat, address, timeout)] = address
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+
+    def scan(self):
+        addresses = (str(address) for address in IPv4Network(self.scan_subnet))
+        servers = 0
+        for address, heartbeat in self.poll(addresses, self.scan_timeout):
+            if not heartbeat:
+                continue
+            factory("server", **heartbeat, ip_address=address, status="up")
+            Session.commit()
+            servers += 1
+        return servers
+
+    def monitor(self):
+        server, heartbeats = models["server"], {}
+        addresses = [
+            address
+            for name, address in Session.query(server.name, server.ip_address)
+            if address and name != self.name
+        ]
+        for address, heartbeat in self.poll(addresses):
+            properties = {"status": "up" if heartbeat else "down"}
+            if heartbeat:
+                properties["cpu_load"] = heartbeats[address] = heartbeat["cpu_load"]
+            Session.query(server).filter_by(ip_address=address).update(properties)
+        Session.commit()
+        return heartbeats
+
+    def servers(self):
+        server, heartbeats = models["server"], self.monitor()
+        live_servers = [(None, 1, cpu_percent())]
+        for name, address, weight in Session.query(
+            server.name, server.ip_address, server.weight
+        ):
+            if name == self.name:
+                live_servers[0] = (None, weight, live_servers[0][2])
+            elif address in heartbeats:
+                live_servers.append((address, weight, heartbeats[address]))
+        return live_servers
+
+    @staticmethod
+    def shard(devices, servers):
+        capacities = [weight * (100 - min(load, 95)) for _, weight, load in servers]
+        total = sum(capacities)
+        if not total:
+            return [(None, devices)]
+        quotas = [len(devices) * capacity / total for capacity in capacities]
+        sizes = [int(quota) for quota in quotas]
+        remainders = sorted(
+            range(len(servers)), key=lambda index: sizes[index] - quotas[index]
+        )
+        for index in remainders[: len(devices) - sum(sizes)]:
+            sizes[index] += 1
+        shards, devices = [], iter(devices)
+        for (address, *_), size in zip(servers, sizes):
+            if size:
+                shards.append((address, list(islice(devices, size))))
+        return shards
+
+    @staticmethod
+    def unreachable(exc):
+        reason = getattr(exc.args[0], "reason", None) if exc.args else None
+        return isinstance(exc, ConnectTimeout) or isinstance(reason, NewConnectionError)
+
+    def run_shard(self, address, credentials, run_id, devices, payload):
+        try:
+            response = self.session.post(
+                self.url(address, "run_shard"),
+                data=dumps(
+                    {"run_id": run_id, "devices": devices, "payload": payload},
+                    default=str,
+                ),
+                headers={"Content-Type": "application/json"},
+                auth=credentials,
+                timeout=self.shard_timeout,
+            )
+        except ConnectionError as exc:
+            if self.unreachable(exc):
+                return None
+            raise
+        if response.status_code == 503:
+            return None
+        response.raise_for_status()
+        return response.json()
@@ -0,0 +1,152 @@
+from difflib import SequenceMatcher
+from functools import lru_cache
+from hashlib import sha256
+from sqlalchemy.exc import IntegrityError
+
+from eNMS.database import Session
+from eNMS.models import models
+
+
+def line_opcodes(first, second):
+    prefix, end = 0, min(len(first), len(second))
+    while prefix < end and first[prefix] == second[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < end - prefix and first[-suffix - 1] == second[-suffix - 1]:
+        suffix += 1
+    first_end, second_end = len(first) - suffix, len(second) - suffix
+    matcher = SequenceMatcher(
+        None, first[prefix:first_end], second[prefix:second_end]
+    )
+    opcodes = [("equal", 0, prefix, 0, prefix)] if prefix else []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        opcodes.append((tag, i1 + prefix, i2 + prefix, j1 + prefix, j2 + prefix))
+    if suffix:
+        opcodes.append(("equal", first_end, len(first), second_end, len(second)))
+    return opcodes
+
+
+class ConfigurationHistory:
+    def __init__(self, keyframe_interval, cache_size):
+        self.keyframe_interval = keyframe_interval
+        self.lines = lru_cache(maxsize=cache_size)(self.load)
+
+    @staticmethod
+    def digest(text):
+        return sha256(text.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def delta(base, lines):
+        delta = []
+        for tag, i1, i2, j1, j2 in line_opcodes(base, lines):
+            if tag == "equal":
+                delta.append([i1, i2])
+            else:
+                delta.extend(lines[j1:j2])
+        return delta
+
+    @staticmethod
+    def patch(base, delta):
+        lines = []
+        for item in delta:
+            if isinstance(item, list):
+                lines.extend(base[slice(*item)])
+            else:
+                lines.append(item)
+        return lines
+
+    def load(self, digest):
+        blob = models["configuration_blob"]
+        base_hash, delta = (
+            Session.query(blob.base_hash, blob.delta).filter_by(hash=digest).one()
+        )
+        base = self.lines(base_hash) if base_hash else ()
+        return tuple(self.patch(base, delta))
+
+    def text(self, digest):
+        return "".join(self.lines(digest))
+
+    def latest(self, device_id, property):
+        version = models["configuration_version"]
+        return (
+            Session.query(version.hash)
+            .filter_by(device_id=device_id, property=property)
+            .order_by(version.runtime.desc(), version.id.desc())
+            .limit(1)
+            .scalar()
+        )
+
+    def store(self, device, property, text, runtime):
+        text, latest = text or "", self.latest(device.id, property)
+        digest = self.digest(text)
+        if digest == latest:
+            return False
+        blob = models["configuration_blob"]
+        if not Session.query(blob.id).filter_by(hash=digest).first():
+            self.create_blob(digest, text, latest)
+        Session.add(
+            models["configuration_version"](
+                device_id=device.id,
+                property=property,
+                hash=digest,
+                runtime=str(runtime),
+            )
+        )
+        Session.flush()
+        return True
+
+    def create_blob(self, digest, text, base_hash):
+        blob, lines = models["configuration_blob"], text.splitlines(keepends=True)
+        base_depth = (
+            Session.query(blob.depth).filter_by(hash=base_hash).scalar()
+            if base_hash
+            else None
+        )
+        if base_depth is None or base_depth + 1 >= self.keyframe_interval:
+            base_hash, depth, delta = None, 0, lines
+        else:
+            depth = base_depth + 1
+            delta = self.delta(self.lines(base_hash), lines)
+        try:
+            with Session.begin_nested():
+                Session.add(
+                    blob(hash=digest, base_hash=base_hash, depth=depth, delta=delta)
+                )
+        except IntegrityError:
+            pass
+
+    def history(self, device_id, property):
+        version = models["configuration_version"]
+        query = (
+            Session.query(version.id, version.runtime, version.hash)
+            .filter_by(device_id=device_id, property=property)
+            .order_by(version.runtime.desc(), version.id.desc())
+        )
+        return [
+            {"id": id, "runtime": runtime, "hash": digest}
+            for id, runtime, digest in query
+        ]
+
+    def compare(self, version1, version2):
+        version = models["configuration_version"]
+        hashes = dict(
+            Session.query(version.id, version.hash).filter(
+                version.id.in_((version1, version2))
+            )
+        )
+        first, second = self.lines(hashes[version1]), self.lines(hashes[version2])
+        return {
+            "first": "".join(first).splitlines(),
+            "second": "".join(second).splitlines(),
+            "opcodes": line_opcodes(first, second),
+        }
+
+    def changed_since(self, runtime, property):
+        device, version = models["device"], models["configuration_version"]
+        query = (
+            Session.query(device.name)
+            .join(version, version.device_id == device.id)
+            .filter(version.property == property, version.runtime >= str(runtime))
+            .distinct()
+        )
+        return [name for (name,) in query]
@@ -0,0 +1,142 @@
+from collections import Counter, defaultdict
+from threading import Lock, Thread
+from time import sleep, time
+
+
+class ConnectionPool:
+    def __init__(self, active, idle_timeout, max_open_connections, eviction_interval):
+        self.active = active
+        self.idle_timeout = idle_timeout
+        self.max_open_connections = max_open_connections
+        self.eviction_interval = eviction_interval
+        self.connections = defaultdict(list)
+        self.counters = Counter()
+        self.lock = Lock()
+        if active:
+            self.start()
+
+    def start(self):
+        th = Thread(target=self.eviction_loop)
+        th.daemon = True
+        th.start()
+
+    def eviction_loop(self):
+        while True:
+            sleep(self.eviction_interval)
+            self.evict_idle_connections()
+
+    @staticmethod
+    def close(key, connection):
+        try:
+            connection.disconnect() if key[0] == "netmiko" else connection.close()
+        except Exception:
+            pass
+
+    def lease(self, key, owner):
+        with self.lock:
+            entries = self.connections.get(key, [])
+            entry = next((e for e in entries if e["owner"] == owner), None)
+            if not entry and self.active:
+                entry = next((e for e in entries if e["owner"] is None), None)
+            if not entry:
+                self.counters["miss"] += 1
+                return None
+            self.counters["hit"] += 1
+            entry.update({"owner": owner, "last_used": time()})
+            return entry["connection"]
+
+    def add(self, key, owner, connection):
+        with self.lock:
+            self.counters["open"] += 1
+            self.connections[key].append(
+                {"connection": connection, "owner": owner, "last_used": time()}
+            )
+
+    def leased_connections(self, owner, device):
+        with self.lock:
+            return [
+                (key, entry["connection"])
+                for key, entries in self.connections.items()
+                for entry in entries
+                if entry["owner"] == owner and key[1] == device
+            ]
+
+    def remove(self, connection):
+        with self.lock:
+            for key, entries in self.connections.items():
+                for entry in entries:
+                    if entry["connection"] is connection:
+                        entries.remove(entry)
+                        return
+
+    def release(self, owner, device=None):
+        released = []
+        with self.lock:
+            for key, entries in self.connections.items():
+                for entry in entries:
+                    if entry["owner"] != owner or device and key[1] != device:
+                        continue
+                    entry.update({"owner": None, "last_used": time()})
+                    if not self.active:
+                        released.append((key, entry))
+            for key, entry in released:
+                self.connections[key].remove(entry)
+        for key, entry in released:
+            self.close(key, entry["connection"])
+
+    def make_room(self):
+        if not self.active:
+            return
+        with self.lock:
+            if self.number_of_connections < self.max_open_connections:
+                return
+            idle_entries = [
+                (entry["last_used"], key, entry)
+                for key, entries in self.connections.items()
+                for entry in entries
+                if entry["owner"] is None
+            ]
+            if not idle_entries:
+                raise Exception(
+                    "The connection pool is full "
+                    f"({self.max_open_connections} open connections)."
+                )
+            _, key, entry = min(idle_entries, key=lambda idle_entry: idle_entry[0])
+            self.connections[key].remove(entry)
+            self.counters["eviction"] += 1
+        self.close(key, entry["connection"])
+
+    def evict_idle_connections(self):
+        evicted, now = [], time()
+        with self.lock:
+            for key, entries in self.connections.items():
+                for entry in list(entries):
+                    if entry["owner"] is None:
+                        if now - entry["last_used"] > self.idle_timeout:
+                            entries.remove(entry)
+                            evicted.append((key, entry["connection"]))
+            self.counters["eviction"] += len(evicted)
+        for key, connection in evicted:
+            self.close(key, connection)
+
+    def after_fork(self):
+        self.connections.clear()
+        self.lock = Lock()
+
+    @property
+    def number_of_connections(self):
+        return sum(len(entries) for entries in self.connections.values())
+
+    @property
+    def metrics(self):
+        with self.lock:
+            leased = sum(
+                bool(entry["owner"])
+                for entries in self.connections.values()
+                for entry in entries
+            )
+            return {
+                "open_connections": self.number_of_connections,
+                "leased_connections": leased,
+                **self.counters,
+            }
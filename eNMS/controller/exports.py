@@ -0,0 +1,176 @@
+from csv import writer
+from io import StringIO
+from re import compile
+from xlwt import Workbook
+from xml.sax.saxutils import escape
+from zipfile import ZIP_DEFLATED, ZipFile
+
+illegal_xml_characters = compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+xlsx_files = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-'
+        'package.relationships+xml"/><Default Extension="xml" ContentType='
+        '"application/xml"/><Override PartName="/xl/workbook.xml" ContentType='
+        '"application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        "{overrides}</Types>"
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/'
+        'relationships"><Relationship Id="rId1" Type="http://schemas.openxmlformats'
+        '.org/officeDocument/2006/relationships/officeDocument" Target='
+        '"xl/workbook.xml"/></Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/'
+        'relationships"><sheets>{sheets}</sheets></workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/'
+        'relationships">{relationships}</Relationships>'
+    ),
+}
+
+xlsx_sheet = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    "<sheetData>",
+    "</sheetData></worksheet>",
+)
+
+
+class StreamBuffer:
+    def __init__(self):
+        self.chunks, self.position = [], 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+class TopologyExport:
+
+    formats = {
+        "csv": "text/csv",
+        "xls": "application/vnd.ms-excel",
+        "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "zip": "application/zip",
+    }
+
+    def __init__(self, chunk_size):
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def extension(export_format, tables):
+        return "zip" if export_format == "csv" and len(tables) > 1 else export_format
+
+    def export(self, export_format, tables):
+        if export_format == "csv" and len(tables) == 1:
+            rows = self.chunks(self.csv(tables[0][1]))
+            return (data.encode("utf-8") for data in rows)
+        writers = {"csv": self.csv_archive, "xls": self.xls, "xlsx": self.xlsx}
+        return writers[export_format](tables)
+
+    def chunks(self, lines):
+        buffer = []
+        for line in lines:
+            buffer.append(line)
+            if len(buffer) == self.chunk_size:
+                yield "".join(buffer)
+                buffer = []
+        yield "".join(buffer)
+
+    def csv(self, rows):
+        buffer = StringIO()
+        csv_writer = writer(buffer)
+        for row in rows:
+            csv_writer.writerow(row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    def csv_archive(self, tables):
+        buffer = StreamBuffer()
+        with ZipFile(buffer, "w", ZIP_DEFLATED) as archive:
+            for name, rows in tables:
+                with archive.open(f"{name}.csv", "w", force_zip64=True) as file:
+                    for data in self.chunks(self.csv(rows)):
+                        file.write(data.encode("utf-8"))
+                        yield buffer.pop()
+        yield buffer.pop()
+
+    @staticmethod
+    def xlsx_cell(value):
+        if isinstance(value, bool):
+            return f'<c t="b"><v>{int(value)}</v></c>'
+        elif isinstance(value, (int, float)):
+            return f"<c><v>{value}</v></c>"
+        value = illegal_xml_characters.sub("", "" if value is None else str(value))
+        text = f'<t xml:space="preserve">{escape(value)}</t>'
+        return f'<c t="inlineStr"><is>{text}</is></c>'
+
+    def xlsx_rows(self, rows):
+        yield xlsx_sheet[0]
+        for row in rows:
+            yield f"<row>{''.join(self.xlsx_cell(value) for value in row)}</row>"
+        yield xlsx_sheet[1]
+
+    def xlsx(self, tables):
+        buffer, names = StreamBuffer(), [name for name, _ in tables]
+        parameters = {
+            "overrides": "".join(
+                f'<Override PartName="/xl/worksheets/sheet{index}.xml" ContentType='
+                '"application/vnd.openxmlformats-officedocument.spreadsheetml.'
+                'worksheet+xml"/>'
+                for index in range(1, len(names) + 1)
+            ),
+            "sheets": "".join(
+                f'<sheet name="{name}" sheetId="{index}" r:id="rId{index}"/>'
+                for index, name in enumerate(names, 1)
+            ),
+            "relationships": "".join(
+                f'<Relationship Id="rId{index}" Type="http://schemas.openxmlformats'
+                '.org/officeDocument/2006/relationships/worksheet" Target='
+                f'"worksheets/sheet{index}.xml"/>'
+                for index in range(1, len(names) + 1)
+            ),
+        }
+        with ZipFile(buffer, "w", ZIP_DEFLATED) as archive:
+            for path, content in xlsx_files.items():
+                archive.writestr(path, content.format(**parameters))
+            for index, (_, rows) in enumerate(tables, 1):
+                sheet = f"xl/worksheets/sheet{index}.xml"
+                with archive.open(sheet, "w", force_zip64=True) as file:
+                    for data in self.chunks(self.xlsx_rows(rows)):
+                        file.write(data.encode("utf-8"))
+                        yield buffer.pop()
+        yield buffer.pop()
+
+    def xls(self, tables):
+        workbook, buffer = Workbook(), StreamBuffer()
+        for name, rows in tables:
+            sheet = workbook.add_sheet(name)
+            for row_index, row in enumerate(rows):
+                if row_index == 65536:
+                    raise ValueError("XLS is limited to 65536 rows: use XLSX or CSV.")
+                for index, value in enumerate(row):
+                    sheet.write(row_index, index, value)
+        workbook.save(buffer)
+        yield buffer.pop()
@@ -1,20 +1,23 @@
 from collections import Counter
+from itertools import islice
 from logging import info
-from os import environ
-from pynetbox import api as netbox_api
-from requests import get as http_get
-from sqlalchemy import and_
+from sqlalchemy import and_, or_
 from subprocess import Popen
 from werkzeug.utils import secure_filename
 from xlrd import open_workbook
 from xlrd.biffh import XLRDError
-from xlwt import Workbook
 
 from eNMS.controller.base import BaseController
 from eNMS.database import Session
-from eNMS.database.functions import delete_all, factory, fetch, fetch_all, objectify
-from eNMS.models import models, property_types
-from eNMS.properties import field_conversion
+from eNMS.database.functions import (
+    delete_all,
+    fetch,
+    fetch_all,
+    objectify,
+    query_properties,
+)
+from eNMS.models import model_properties, models, property_types
+from eNMS.properties import field_conversion, private_properties
 from eNMS.properties.table import table_properties
 
 
@@ -62,134 +65,230 @@ class InventoryController(BaseController):
             "server_addr": self.config["app"]["address"],
         }
 
-    def get_device_logs(self, device_id):
-        device_logs = [
-            log.name
-            for log in fetch_all("log")
-            if log.source == fetch("device", id=device_id).ip_address
-        ]
-        return "\n".join(device_logs)
+    def get_device_logs(self, device_id, **kwargs):
+        device, log = fetch("device", id=device_id), models["log"]
+        query = Session.query(log.id, log.time, log.content).filter(
+            log.source == device.ip_address
+        )
+        if kwargs.get("start"):
+            query = query.filter(log.time >= kwargs["start"])
+        if kwargs.get("end_id"):
+            end, end_id = kwargs["end"], int(kwargs["end_id"])
+            query = query.filter(
+                or_(log.time < end, and_(log.time == end, log.id < end_id))
+            )
+        elif kwargs.get("end"):
+            query = query.filter(log.time < kwargs["end"])
+        if kwargs.get("search"):
+            query = query.filter(log.content.contains(kwargs["search"]))
+        page_size = int(kwargs.get("page_size", 1000))
+        logs = query.order_by(log.time.desc(), log.id.desc()).limit(page_size + 1)
+        logs = logs.all()
+        lines = [f"{time} {content}" for _, time, content in logs[:page_size]]
+        last_log = logs[page_size - 1] if len(logs) > page_size else None
+        return {
+            "logs": "\n".join(lines),
+            "end": last_log.time if last_log else None,
+            "end_id": last_log.id if last_log else None,
+        }
 
     def get_device_network_data(self, device_id):
         device = fetch("device", id=device_id)
         return {"configuration": device.configuration, "data": device.operational_data}
 
+    def get_configuration_history(self, device_id, property="configuration"):
+        return self.configuration_history.history(int(device_id), property)
+
+    def compare_configurations(self, version1, version2):
+        return self.configuration_history.compare(int(version1), int(version2))
+
+    def get_changed_devices(self, runtime, property="configuration"):
+        return self.configuration_history.changed_since(runtime, property)
+
     def counters(self, property, type):
-        return Counter(str(getattr(instance, property)) for instance in fetch_all(type))
+        return self.property_counts(type, property)
+
+    def topology_rows(self, obj_type):
+        properties = table_properties[obj_type]
+        yield properties
+        query = query_properties(obj_type, properties)
+        yield from query.yield_per(self.topology_export.chunk_size)
+
+    def stream_topology(self, export_format="xls", object_types=("device", "link")):
+        tables = [(obj_type, self.topology_rows(obj_type)) for obj_type in object_types]
+        extension = self.topology_export.extension(export_format, tables)
+        return extension, self.topology_export.export(export_format, tables)
 
     def export_topology(self, **kwargs):
-        workbook = Workbook()
         filename = kwargs["export_filename"]
+        export_format = kwargs.get("export_format", "xls")
+        object_types = kwargs.get("object_types", ("device", "link"))
+        extension, data = self.stream_topology(export_format, object_types)
         if "." not in filename:
-            filename += ".xls"
-        for obj_type in ("device", "link"):
-            sheet = workbook.add_sheet(obj_type)
-            for index, property in enumerate(table_properties[obj_type]):
-                sheet.write(0, index, property)
-                for obj_index, obj in enumerate(fetch_all(obj_type), 1):
-                    sheet.write(obj_index, index, getattr(obj, property))
-        workbook.save(self.path / "files" / "spreadsheets" / filename)
+            filename += f".{extension}"
+        with open(self.path / "files" / "spreadsheets" / filename, "wb") as file:
+            for chunk in data:
+                file.write(chunk)
 
     def query_netbox(self, **kwargs):
-        nb = netbox_api(
-            self.config["netbox"]["address"], token=environ.get("NETBOX_TOKEN")
-        )
-        for device in nb.dcim.devices.all():
-            device_ip = device.primary_ip4 or device.primary_ip6
-            factory(
-                "device",
-                **{
-                    "name": device.name,
-                    "ip_address": str(device_ip).split("/")[0],
-                    "subtype": str(device.device_role),
-                    "model": str(device.device_type),
-                    "location": str(device.site),
-                    "vendor": str(device.device_type.manufacturer),
-                    "operating_system": str(device.platform),
-                    "longitude": str(nb.dcim.sites.get(name=device.site).longitude),
-                    "latitude": str(nb.dcim.sites.get(name=device.site).latitude),
-                },
-            )
+        return self.sync_inventory("netbox")
 
     def query_librenms(self, **kwargs):
-        devices = http_get(
-            f'{self.config["opennms"]["address"]}/api/v0/devices',
-            headers={"X-Auth-Token": environ.get("LIBRENMS_TOKEN")},
-        ).json()["devices"]
-        for device in devices:
-            factory(
-                "device",
-                **{
-                    "name": device["hostname"],
-                    "ip_address": device["ip"] or device["hostname"],
-                    "model": device["hardware"],
-                    "operating_system": device["os"],
-                    "os_version": device["version"],
-                    "location": device["location"],
-                    "longitude": device["lng"],
-                    "latitude": device["lat"],
-                },
-            )
+        return self.sync_inventory("librenms")
+
+    def query_opennms(self, **kwargs):
+        return self.sync_inventory("opennms")
+
+    def sync_inventory(self, source):
+        devices = getattr(self.inventory_sync, source)(**self.config[source])
+        counters, chunk_size = Counter(), self.config["topology_import"]["chunk_size"]
+        for chunk in iter(lambda: list(islice(devices, chunk_size)), []):
+            self.sync_objects("device", chunk, counters)
+        counters = +counters
+        if counters:
+            self.update_all_pools()
+        summary = ", ".join(f"{number} {key}" for key, number in counters.items())
+        self.log("info", f"INVENTORY SYNC ({source}): {summary or 'no change'}")
+        return dict(counters)
 
-    def query_opennms(self):
-        login = self.config["opennms"]["login"]
-        password = environ.get("OPENNMS_PASSWORD")
-        Session.commit()
-        json_devices = http_get(
-            self.config["opennms"]["devices"],
-            headers={"Accept": "application/json"},
-            auth=(login, password),
-        ).json()["node"]
-        devices = {
-            device["id"]: {
-                "name": device.get("label", device["id"]),
-                "description": device["assetRecord"].get("description", ""),
-                "location": device["assetRecord"].get("building", ""),
-                "vendor": device["assetRecord"].get("manufacturer", ""),
-                "model": device["assetRecord"].get("modelNumber", ""),
-                "operating_system": device.get("operatingSystem", ""),
-                "os_version": device["assetRecord"].get("sysDescription", ""),
-                "longitude": device["assetRecord"].get("longitude", 0.0),
-                "latitude": device["assetRecord"].get("latitude", 0.0),
+    def sync_objects(self, obj_type, rows, counters):
+        objects = {
+            str(row["name"]): {
+                property: str(value)
+                for property, value in row.items()
+                if value is not None and property != "name"
             }
-            for device in json_devices
+            for row in rows
         }
-        for device in list(devices):
-            link = http_get(
-                f"{self.config['opennms']['address']}/nodes/{device}/ipinterfaces",
-                headers={"Accept": "application/json"},
-                auth=(login, password),
-            ).json()
-            for interface in link["ipInterface"]:
-                if interface["snmpPrimary"] == "P":
-                    devices[device]["ip_address"] = interface["ipAddress"]
-                    factory("device", **devices[device])
+        model, obj = models[obj_type], models["object"]
+        properties = sorted(
+            {property for values in objects.values() for property in values}
+        )
+        columns = [getattr(model, property) for property in properties]
+        query = Session.query(model.name, model.id, *columns).filter(
+            model.name.in_(objects)
+        )
+        updates = []
+        for name, object_id, *values in query:
+            current_values = dict(zip(properties, values))
+            changes = {
+                property: value
+                for property, value in objects.pop(name).items()
+                if current_values[property] != value
+            }
+            if changes:
+                updates.append({"id": object_id, **changes})
+        query = Session.query(obj.name, obj.type).filter(obj.name.in_(objects))
+        for name, object_type in query:
+            info(f"'{name}' could not be synchronized (existing {object_type})")
+            objects.pop(name)
+        creations = [
+            {"type": obj_type, "name": name, **values}
+            for name, values in objects.items()
+        ]
+        try:
+            Session.bulk_insert_mappings(model, creations, return_defaults=True)
+            Session.bulk_update_mappings(model, updates)
+            Session.commit()
+        except Exception as exc:
+            Session.rollback()
+            info(f"{len(rows)} {obj_type}s could not be synchronized ({str(exc)})")
+            return
+        counters[f"{obj_type}s created"] += len(creations)
+        counters[f"{obj_type}s updated"] += len(updates)
 
     def topology_import(self, file):
-        book = open_workbook(file_contents=file.read())
-        status = "Topology successfully imported."
+        book = open_workbook(file_contents=file.read(), on_demand=True)
+        status, counters = "Topology successfully imported.", Counter()
+        chunk_size = self.config["topology_import"]["chunk_size"]
         for obj_type in ("device", "link"):
             try:
                 sheet = book.sheet_by_name(obj_type)
             except XLRDError:
                 continue
             properties = sheet.row_values(0)
-            for row_index in range(1, sheet.nrows):
-                values = {"dont_update_pools": True}
-                for index, property in enumerate(properties):
-                    func = field_conversion[property_types[property]]
-                    values[property] = func(sheet.row_values(row_index)[index])
-                try:
-                    factory(obj_type, **values).serialized
-                except Exception as e:
-                    info(f"{str(values)} could not be imported ({str(e)})")
+            rows = (sheet.row_values(index) for index in range(1, sheet.nrows))
+            for chunk in iter(lambda: list(islice(rows, chunk_size)), []):
+                if not self.import_objects(obj_type, properties, chunk, counters):
                     status = "Partial import (see logs)."
-            Session.commit()
-        for pool in fetch_all("pool"):
-            pool.compute_pool()
-        self.log("info", status)
+            book.unload_sheet(obj_type)
+        self.update_all_pools()
+        summary = ", ".join(f"{number} {key}" for key, number in counters.items())
+        self.log("info", f"TOPOLOGY IMPORT: {status} ({summary or 'no object'})")
         return status
 
+    def import_values(self, obj_type, properties, row):
+        values = {
+            property: field_conversion[property_types[property]](value)
+            for property, value in zip(properties, row)
+            if property in model_properties[obj_type]
+            or property in ("source_name", "destination_name")
+        }
+        if {"/", '"', "'"} & set(values["name"]):
+            raise Exception("Names cannot contain a slash or a quote.")
+        for property in private_properties:
+            value = values.pop(property, None)
+            if value and self.config["vault"]["active"]:
+                self.vault_cache.write(obj_type, values["name"], property, value)
+            elif value:
+                values[property] = value
+        return values
+
+    def resolve_link_endpoints(self, links):
+        device = models["device"]
+        names = {
+            values.get(f"{endpoint}_name")
+            for values in links.values()
+            for endpoint in ("source", "destination")
+        }
+        query = Session.query(device.name, device.id).filter(device.name.in_(names))
+        devices, success = dict(query), True
+        for name, values in list(links.items()):
+            for endpoint in ("source", "destination"):
+                device_name = values.pop(f"{endpoint}_name", None)
+                if device_name not in devices:
+                    info(f"Link '{name}' could not be imported (no {endpoint} device)")
+                    links.pop(name)
+                    success = False
+                    break
+                values[f"{endpoint}_id"] = devices[device_name]
+        return success
+
+    def import_objects(self, obj_type, properties, rows, counters):
+        objects, success = {}, True
+        for row in rows:
+            try:
+                values = self.import_values(obj_type, properties, row)
+                objects[values["name"]] = values
+            except Exception as exc:
+                info(f"{str(row)} could not be imported ({str(exc)})")
+                success = False
+        if obj_type == "link" and not self.resolve_link_endpoints(objects):
+            success = False
+        obj, updates = models["object"], []
+        query = Session.query(obj.name, obj.id, obj.type).filter(obj.name.in_(objects))
+        for name, object_id, object_type in query:
+            values = objects.pop(name)
+            if object_type == obj_type:
+                updates.append({"id": object_id, **values})
+            else:
+                info(f"'{name}' could not be imported (existing {object_type})")
+                success = False
+        creations = [{"type": obj_type, **values} for values in objects.values()]
+        try:
+            Session.bulk_insert_mappings(
+                models[obj_type], creations, return_defaults=True
+            )
+            Session.bulk_update_mappings(models[obj_type], updates)
+            Session.commit()
+        except Exception as exc:
+            Session.rollback()
+            info(f"{len(rows)} {obj_type}s could not be imported ({str(exc)})")
+            return False
+        counters[f"{obj_type}s created"] += len(creations)
+        counters[f"{obj_type}s updated"] += len(updates)
+        return success
+
     def import_topology(self, **kwargs):
         file = kwargs["file"]
         if kwargs["replace"]:
@@ -223,8 +322,8 @@ class InventoryController(BaseController):
         fetch("pool", id=int(pool_id)).compute_pool()
 
     def update_all_pools(self):
-        for pool in fetch_all("pool"):
-            pool.compute_pool()
+        pools = [pool for pool in fetch_all("pool") if not pool.never_update]
+        self.pool_index.compute_pools(pools)
 
     def get_view_topology(self):
         return {
@@ -0,0 +1,109 @@
+from json import dumps, loads
+from os import getpid
+from string import punctuation
+from threading import Lock
+
+
+class RunLog:
+    def __init__(self, path, buffer_size):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.lines, self.first_line, self.chunks = [], 0, []
+        self.lock = Lock()
+
+    def __len__(self):
+        return self.first_line + len(self.lines)
+
+    def append(self, line):
+        with self.lock:
+            self.lines.append(line)
+            if len(self.lines) > self.buffer_size:
+                self.spill()
+
+    def extend(self, lines):
+        for line in lines:
+            self.append(line)
+
+    def spill(self):
+        number_of_lines = len(self.lines) // 2
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "ab") as file:
+            self.chunks.append((self.first_line, file.tell()))
+            file.writelines(
+                f"{dumps(line)}\n".encode("utf-8")
+                for line in self.lines[:number_of_lines]
+            )
+        del self.lines[:number_of_lines]
+        self.first_line += number_of_lines
+
+    def read(self, offset=0):
+        with self.lock:
+            lines, first_line = self.lines[:], self.first_line
+            chunks = [chunk for chunk in self.chunks if chunk[0] <= offset]
+        start = offset - first_line
+        if start >= 0:
+            return lines[start:]
+        line_number, position = chunks[-1]
+        spilled_lines = []
+        with open(self.path, "rb") as file:
+            file.seek(position)
+            for index, line in enumerate(file, line_number):
+                if index >= first_line:
+                    break
+                elif index >= offset:
+                    spilled_lines.append(loads(line))
+        return spilled_lines + lines
+
+    def close(self):
+        if self.chunks:
+            self.path.unlink()
+
+
+class RunLogs(dict):
+    def __init__(self, path, buffer_size):
+        super().__init__()
+        self.path = path
+        self.buffer_size = buffer_size
+
+    def __missing__(self, runtime):
+        name = runtime.translate(str.maketrans("", "", f"{punctuation} "))
+        path = self.path / f"{name}-{getpid()}.log"
+        return self.setdefault(runtime, RunLog(path, self.buffer_size))
+
+    def pop(self, runtime, default=None):
+        run_log = super().pop(runtime, None)
+        if run_log is None:
+            return default
+        lines = run_log.read()
+        run_log.close()
+        return lines
+
+    def read(self, runtime, offset=0):
+        run_log = self.get(runtime)
+        return run_log.read(offset) if run_log is not None else []
+
+
+class SharedRunLog:
+    def __init__(self, store, runtime):
+        self.store = store
+        self.runtime = runtime
+
+    def append(self, line):
+        self.store.append_logs(self.runtime, [line])
+
+    def extend(self, lines):
+        self.store.append_logs(self.runtime, lines)
+
+
+class SharedRunLogs:
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, runtime):
+        return SharedRunLog(self.store, runtime)
+
+    def pop(self, runtime, default=None):
+        return self.store.pop_logs(runtime) or default
+
+    def read(self, runtime, offset=0):
+        return self.store.read_logs(runtime, offset)
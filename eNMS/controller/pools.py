@@ -0,0 +1,184 @@
+from collections import defaultdict
+from re import compile
+from sqlalchemy import func
+
+from eNMS.database import Session
+from eNMS.database.associations import pool_device_table, pool_link_table
+from eNMS.database.functions import fetch_all, query_properties
+from eNMS.models import models
+from eNMS.properties.objects import pool_device_properties, pool_link_properties
+
+text_properties = ("configuration", "operational_data")
+
+
+class PoolIndex:
+    def __init__(self, generations):
+        self.generations, self.indexes = generations, None
+
+    def invalidate(self):
+        self.indexes = None
+
+    @staticmethod
+    def pool_properties(obj_type):
+        if obj_type == "device":
+            return pool_device_properties
+        else:
+            return pool_link_properties
+
+    def build_index(self, pools, obj_type):
+        index = {
+            "always": set(),
+            "pools": {},
+            "properties": defaultdict(set),
+            "equality": defaultdict(lambda: defaultdict(set)),
+            "inclusion": defaultdict(lambda: defaultdict(set)),
+            "patterns": defaultdict(list),
+        }
+        for pool in pools:
+            properties = self.pool_properties(obj_type)
+            criteria = [
+                (property, getattr(pool, f"{obj_type}_{property}"))
+                for property in properties
+                if getattr(pool, f"{obj_type}_{property}")
+            ]
+            if not criteria or pool.operator != "all" and (
+                len(criteria) < len(properties)
+            ):
+                index["always"].add(pool.id)
+                continue
+            index["pools"][pool.id] = (pool.operator, len(criteria))
+            for property, value in criteria:
+                index["properties"][property].add(pool.id)
+                match = getattr(pool, f"{obj_type}_{property}_match")
+                if match in ("equality", "inclusion"):
+                    index[match][property][value].add(pool.id)
+                else:
+                    index["patterns"][property].append((pool.id, compile(value)))
+        return index
+
+    def get_index(self, obj_type):
+        if self.generations.stale(("pool_index",)) or self.indexes is None:
+            pools = [pool for pool in fetch_all("pool") if not pool.never_update]
+            self.indexes = {
+                obj_type: self.build_index(pools, obj_type)
+                for obj_type in ("device", "link")
+            }
+        return self.indexes[obj_type]
+
+    @staticmethod
+    def matching_pools(index, values, counts=None):
+        counts = defaultdict(int, counts or {})
+        for property, value in values.items():
+            for pool_id in index["equality"][property].get(value, ()):
+                counts[pool_id] += 1
+            for substring, pool_ids in index["inclusion"][property].items():
+                if substring in value:
+                    for pool_id in pool_ids:
+                        counts[pool_id] += 1
+            for pool_id, pattern in index["patterns"][property]:
+                if pattern.search(value):
+                    counts[pool_id] += 1
+        matches = set(index["always"])
+        for pool_id, count in counts.items():
+            operator, number_of_criteria = index["pools"][pool_id]
+            if operator != "all" or count == number_of_criteria:
+                matches.add(pool_id)
+        return matches
+
+    def object_values(self, obj):
+        properties = self.get_index(obj.class_type)["properties"]
+        return {property: str(getattr(obj, property)) for property in properties}
+
+    def update_object(self, obj, old_values=None):
+        index = self.get_index(obj.class_type)
+        values = self.object_values(obj)
+        if old_values is None:
+            pool_ids = set(index["always"]) | set(index["pools"])
+        else:
+            pool_ids = set().union(
+                *(
+                    index["properties"][property]
+                    for property, value in values.items()
+                    if old_values.get(property) != value
+                )
+            )
+        if not pool_ids:
+            return
+        matches = self.matching_pools(index, values) & pool_ids
+        number = f"{obj.class_type}_number"
+        for pool in list(obj.pools):
+            if pool.id in pool_ids and pool.id not in matches:
+                obj.pools.remove(pool)
+                setattr(pool, number, getattr(pool, number) - 1)
+            matches.discard(pool.id)
+        if not matches:
+            return
+        pool_model = models["pool"]
+        for pool in Session.query(pool_model).filter(pool_model.id.in_(matches)):
+            obj.pools.append(pool)
+            setattr(pool, number, getattr(pool, number) + 1)
+
+    def text_matches(self, obj_type, index):
+        model, matches = models[obj_type], defaultdict(lambda: defaultdict(int))
+        for property in text_properties:
+            if property not in index["properties"]:
+                continue
+            column = func.coalesce(getattr(model, property), "None")
+            criteria = [
+                (value, pool_ids, column == value, True)
+                for value, pool_ids in index["equality"][property].items()
+            ] + [
+                (value, pool_ids, column.contains(value, autoescape=True), False)
+                for value, pool_ids in index["inclusion"][property].items()
+            ]
+            for value, pool_ids, condition, equality in criteria:
+                query = Session.query(model.id, column).filter(condition)
+                for object_id, text in query.yield_per(100):
+                    if text != value if equality else value not in text:
+                        continue
+                    for pool_id in pool_ids:
+                        matches[object_id][pool_id] += 1
+            if not index["patterns"][property]:
+                continue
+            for object_id, text in Session.query(model.id, column).yield_per(100):
+                for pool_id, pattern in index["patterns"][property]:
+                    if pattern.search(text):
+                        matches[object_id][pool_id] += 1
+        return matches
+
+    def object_rows(self, obj_type, properties):
+        return query_properties(obj_type, ["id", *properties]).all()
+
+    def compute_pool(self, pool):
+        self.compute_pools([pool])
+
+    def compute_pools(self, pools):
+        if not pools:
+            return
+        Session.flush()
+        pool_ids = [pool.id for pool in pools]
+        tables = {"device": pool_device_table, "link": pool_link_table}
+        for obj_type, table in tables.items():
+            index, members = self.build_index(pools, obj_type), defaultdict(list)
+            properties = [p for p in index["properties"] if p not in text_properties]
+            text_matches = self.text_matches(obj_type, index)
+            for object_id, *row in self.object_rows(obj_type, properties):
+                values = dict(zip(properties, map(str, row)))
+                counts = text_matches.get(object_id)
+                for pool_id in self.matching_pools(index, values, counts):
+                    members[pool_id].append(object_id)
+            Session.execute(table.delete().where(table.c.pool_id.in_(pool_ids)))
+            rows = [
+                {"pool_id": pool_id, f"{obj_type}_id": object_id}
+                for pool_id, object_ids in members.items()
+                for object_id in object_ids
+            ]
+            if rows:
+                Session.execute(table.insert(), rows)
+            for pool in pools:
+                setattr(pool, f"{obj_type}_number", len(members[pool.id]))
+            for obj in list(Session.identity_map.values()):
+                if isinstance(obj, models[obj_type]) and "pools" in obj.__dict__:
+                    Session.expire(obj, ["pools"])
+        for pool in pools:
+            Session.expire(pool, ["devices", "links"])
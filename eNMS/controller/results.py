@@ -0,0 +1,71 @@
+from logging import error
+from threading import Event, Lock, Thread
+
+from eNMS.database import Session
+from eNMS.models import models
+
+
+class BatchWriter:
+    def __init__(self, model, batch_size, flush_interval, max_failures=3):
+        self.model = model
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_failures = max_failures
+        self.after_fork()
+
+    def after_fork(self):
+        self.rows, self.failures = [], 0
+        self.lock, self.write_lock = Lock(), Lock()
+        self.batch_ready = Event()
+        self.start()
+
+    def start(self):
+        th = Thread(target=self.writer_loop)
+        th.daemon = True
+        th.start()
+
+    def writer_loop(self):
+        while True:
+            self.batch_ready.wait(self.flush_interval)
+            self.batch_ready.clear()
+            try:
+                self.flush()
+            except Exception as exc:
+                error(f"Batch Writer: failed to write {self.model}s ({exc})")
+            finally:
+                Session.remove()
+
+    def add(self, **row):
+        with self.lock:
+            self.rows.append(row)
+            if len(self.rows) >= self.batch_size:
+                self.batch_ready.set()
+
+    def flush(self):
+        with self.write_lock:
+            with self.lock:
+                rows, self.rows = self.rows, []
+            if not rows:
+                return
+            if self.failures >= self.max_failures:
+                return self.insert_rows(rows)
+            try:
+                Session.bulk_insert_mappings(models[self.model], rows)
+                Session.commit()
+            except Exception:
+                Session.rollback()
+                self.failures += 1
+                with self.lock:
+                    self.rows[:0] = rows
+                raise
+            self.failures = 0
+
+    def insert_rows(self, rows):
+        for row in rows:
+            try:
+                Session.bulk_insert_mappings(models[self.model], [row])
+                Session.commit()
+            except Exception as exc:
+                Session.rollback()
+                error(f"Batch Writer: {self.model} dropped ({exc})")
+        self.failures = 0
@@ -0,0 +1,135 @@
+from datetime import datetime, timedelta
+from itertools import islice
+from logging import error, info
+from sqlalchemy import func, or_
+
+from eNMS.database import Session
+from eNMS.database.associations import run_device_table, run_pool_table
+from eNMS.models import models
+
+
+class ResultRetention:
+    def __init__(self, active, interval, chunk_size):
+        self.active = active
+        self.interval = interval
+        self.chunk_size = chunk_size
+
+    def chunks(self, values):
+        values = iter(values)
+        yield from iter(lambda: list(islice(values, self.chunk_size)), [])
+
+    def apply(self):
+        service = models["service"]
+        policies = Session.query(
+            service.id,
+            service.retention_runs,
+            service.retention_days,
+            service.retention_failures_only,
+        ).filter(
+            or_(
+                service.retention_runs > 0,
+                service.retention_days > 0,
+                service.retention_failures_only == True,  # noqa: E712
+            )
+        )
+        try:
+            for policy in policies.all():
+                runtimes = self.expired_runtimes(*policy)
+                if runtimes:
+                    self.prune(runtimes)
+                    info(f"Result Retention: {len(runtimes)} runs pruned")
+        except Exception as exc:
+            Session.rollback()
+            error(f"Result Retention: failed to prune results ({exc})")
+        finally:
+            Session.remove()
+
+    def expired_runtimes(self, service_id, runs, days, failures_only):
+        run = models["run"]
+        cutoff = str(datetime.now() - timedelta(days=days)) if days else ""
+        query = (
+            Session.query(run.runtime, run.success)
+            .filter(
+                run.service_id == service_id,
+                run.runtime == run.parent_runtime,
+                run.status != "Running",
+            )
+            .order_by(run.runtime.desc())
+        )
+        kept, expired = 0, []
+        for runtime, success in query.yield_per(self.chunk_size):
+            if (
+                failures_only
+                and success
+                or runtime < cutoff
+                or runs
+                and kept >= runs
+            ):
+                expired.append(runtime)
+            else:
+                kept += 1
+        return expired
+
+    def prune(self, runtimes):
+        run = models["run"]
+        for chunk in self.chunks(runtimes):
+            self.compact(chunk)
+            run_ids = Session.query(run.id).filter(run.parent_runtime.in_(chunk))
+            self.delete_runs([run_id for run_id, in run_ids])
+
+    def compact(self, runtimes):
+        result, summary = models["result"], models["result_summary"]
+        result_day = func.substr(result.runtime, 1, 10)
+        rows = (
+            Session.query(
+                result.service_id,
+                result.device_id,
+                result_day,
+                result.success,
+                func.count(result.id),
+            )
+            .filter(result.parent_runtime.in_(runtimes))
+            .group_by(result.service_id, result.device_id, result_day, result.success)
+        )
+        summaries = {}
+        for service_id, device_id, day, success, count in rows:
+            key = (service_id, device_id, day)
+            if key not in summaries:
+                summaries[key] = {"success_count": 0, "failure_count": 0}
+            summaries[key]["success_count" if success else "failure_count"] += count
+        new_summaries = []
+        for (service_id, device_id, day), counts in summaries.items():
+            query = Session.query(summary).filter_by(
+                service_id=service_id, device_id=device_id, day=day
+            )
+            increments = {
+                getattr(summary, key): getattr(summary, key) + value
+                for key, value in counts.items()
+            }
+            if not query.update(increments, synchronize_session=False):
+                new_summaries.append(
+                    {
+                        "service_id": service_id,
+                        "device_id": device_id,
+                        "day": day,
+                        **counts,
+                    }
+                )
+        Session.bulk_insert_mappings(summary, new_summaries)
+
+    def delete_runs(self, run_ids):
+        run, result = models["run"], models["result"]
+        for chunk in self.chunks(run_ids):
+            for column in (run.parent_id, run.restart_run_id):
+                Session.query(run).filter(column.in_(chunk)).update(
+                    {column: None}, synchronize_session=False
+                )
+            for table in (run_device_table, run_pool_table):
+                Session.execute(table.delete().where(table.c.run_id.in_(chunk)))
+            Session.query(result).filter(result.run_id.in_(chunk)).delete(
+                synchronize_session=False
+            )
+            Session.query(run).filter(run.id.in_(chunk)).delete(
+                synchronize_session=False
+            )
+            Session.commit()
@@ -0,0 +1,271 @@
+from contextlib import contextmanager
+from json import dumps, loads
+from os import getpid
+from sqlite3 import connect
+from threading import Lock, local
+
+
+def wakeup():
+    pass
+
+
+class RunStore:
+    def __init__(self):
+        self.states, self.lock = {}, Lock()
+
+    def after_fork(self):
+        self.lock = Lock()
+
+    @staticmethod
+    def node(state, path):
+        for key in path:
+            state = state.setdefault(key, {})
+        return state
+
+    def create(self, key, state):
+        with self.lock:
+            return self.states.setdefault(key, state) is state
+
+    def setdefault(self, key, path, value):
+        with self.lock:
+            node = self.node(self.states.setdefault(key, {}), path[:-1])
+            node.setdefault(path[-1], value)
+
+    def get(self, key):
+        return self.states.get(key)
+
+    def pop(self, key):
+        with self.lock:
+            return self.states.pop(key, None)
+
+    def value(self, key, path, default=None):
+        value = self.states.get(key, default)
+        for item in path:
+            if not isinstance(value, dict) or item not in value:
+                return default
+            value = value[item]
+        return value
+
+    def set(self, key, path, value):
+        with self.lock:
+            self.node(self.states.setdefault(key, {}), path[:-1])[path[-1]] = value
+
+    def increment(self, key, path, value=1):
+        with self.lock:
+            node = self.node(self.states.setdefault(key, {}), path[:-1])
+            node[path[-1]] = node.get(path[-1], 0) + value
+            return node[path[-1]]
+
+    def increment_many(self, key, paths, value=1):
+        with self.lock:
+            for path in paths:
+                node = self.node(self.states.setdefault(key, {}), path[:-1])
+                node[path[-1]] = node.get(path[-1], 0) + value
+
+    def append(self, key, path, value):
+        with self.lock:
+            node = self.node(self.states.setdefault(key, {}), path[:-1])
+            node.setdefault(path[-1], []).append(value)
+
+
+class SQLiteRunStore(RunStore):
+    def __init__(self, path):
+        self.path, self.local = path, local()
+        with self.transaction() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS run_state "
+                "(key TEXT, path TEXT, value TEXT, PRIMARY KEY (key, path))"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS run_log "
+                "(id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT, line TEXT)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_run_log_key ON run_log (key, id)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS run_list (id INTEGER PRIMARY KEY "
+                "AUTOINCREMENT, key TEXT, path TEXT, value TEXT)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_run_list_key ON run_list (key, path)"
+            )
+
+    @property
+    def connection(self):
+        if getattr(self.local, "pid", None) != getpid():
+            connection = connect(str(self.path), timeout=60, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self.local.connection, self.local.pid = connection, getpid()
+        return self.local.connection
+
+    @contextmanager
+    def transaction(self):
+        connection = self.connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    @staticmethod
+    def flatten(value, path):
+        if isinstance(value, dict) and value:
+            for key, child in value.items():
+                yield from SQLiteRunStore.flatten(child, (*path, str(key)))
+        else:
+            yield "/".join(path), dumps(value, default=str)
+
+    def rows(self, connection, key, path):
+        prefix = "/".join(path)
+        condition = "key = ? AND (? = '' OR path = ? OR substr(path, 1, ?) = ?)"
+        parameters = (key, prefix, prefix, len(prefix) + 1, f"{prefix}/")
+        return [
+            (*row, False)
+            for row in connection.execute(
+                f"SELECT path, value FROM run_state WHERE {condition} ORDER BY path",
+                parameters,
+            )
+        ] + [
+            (*row, True)
+            for row in connection.execute(
+                f"SELECT path, value FROM run_list WHERE {condition} ORDER BY id",
+                parameters,
+            )
+        ]
+
+    def build(self, rows, path):
+        root, prefix, depth = {}, "/".join(path), len(path)
+        for row_path, value, appended in rows:
+            relative_path = [] if row_path == prefix else row_path.split("/")[depth:]
+            *parents, last = ["", *relative_path]
+            node, value = self.node(root, parents), loads(value)
+            if appended:
+                node.setdefault(last, []).append(value)
+            elif value == {}:
+                node.setdefault(last, {})
+            else:
+                node[last] = value
+        return root[""]
+
+    def write(self, connection, key, path, value):
+        prefix = "/".join(path)
+        for table in ("run_state", "run_list"):
+            connection.execute(
+                f"DELETE FROM {table} WHERE key = ? AND "
+                "(path = ? OR substr(path, 1, ?) = ?)",
+                (key, prefix, len(prefix) + 1, f"{prefix}/"),
+            )
+        connection.executemany(
+            "INSERT INTO run_state (key, path, value) VALUES (?, ?, ?)",
+            ((key, *row) for row in self.flatten(value, path)),
+        )
+
+    def create(self, key, state):
+        with self.transaction() as connection:
+            if self.rows(connection, key, ()):
+                return False
+            connection.executemany(
+                "INSERT INTO run_state (key, path, value) VALUES (?, ?, ?)",
+                ((key, *row) for row in self.flatten(state, ())),
+            )
+            return True
+
+    def setdefault(self, key, path, value):
+        with self.transaction() as connection:
+            if not self.rows(connection, key, path):
+                self.write(connection, key, path, value)
+
+    def get(self, key):
+        rows = self.rows(self.connection, key, ())
+        return self.build(rows, ()) if rows else None
+
+    def pop(self, key):
+        with self.transaction() as connection:
+            rows = self.rows(connection, key, ())
+            connection.execute("DELETE FROM run_state WHERE key = ?", (key,))
+            connection.execute("DELETE FROM run_list WHERE key = ?", (key,))
+        return self.build(rows, ()) if rows else None
+
+    def value(self, key, path, default=None):
+        rows = self.rows(self.connection, key, path)
+        return self.build(rows, path) if rows else default
+
+    def set(self, key, path, value):
+        with self.transaction() as connection:
+            self.write(connection, key, path, value)
+
+    @staticmethod
+    def add(connection, key, path, value):
+        parameters = (key, "/".join(path))
+        connection.execute(
+            "INSERT OR IGNORE INTO run_state (key, path, value) VALUES (?, ?, '0')",
+            parameters,
+        )
+        connection.execute(
+            "UPDATE run_state SET value = value + ? WHERE key = ? AND path = ?",
+            (value, *parameters),
+        )
+        return connection.execute(
+            "SELECT value FROM run_state WHERE key = ? AND path = ?", parameters
+        ).fetchone()[0]
+
+    def increment(self, key, path, value=1):
+        with self.transaction() as connection:
+            return loads(self.add(connection, key, path, value))
+
+    def increment_many(self, key, paths, value=1):
+        with self.transaction() as connection:
+            for path in paths:
+                self.add(connection, key, path, value)
+
+    def append(self, key, path, value):
+        self.connection.execute(
+            "INSERT INTO run_list (key, path, value) VALUES (?, ?, ?)",
+            (key, "/".join(path), dumps(value, default=str)),
+        )
+
+    def append_logs(self, key, lines):
+        with self.transaction() as connection:
+            connection.executemany(
+                "INSERT INTO run_log (key, line) VALUES (?, ?)",
+                ((key, dumps(line)) for line in lines),
+            )
+
+    def read_logs(self, key, offset=0):
+        return [
+            loads(line)
+            for (line,) in self.connection.execute(
+                "SELECT line FROM run_log WHERE key = ? ORDER BY id LIMIT -1 OFFSET ?",
+                (key, offset),
+            )
+        ]
+
+    def pop_logs(self, key):
+        with self.transaction() as connection:
+            lines = [
+                loads(line)
+                for (line,) in connection.execute(
+                    "SELECT line FROM run_log WHERE key = ? ORDER BY id", (key,)
+                )
+            ]
+            connection.execute("DELETE FROM run_log WHERE key = ?", (key,))
+        return lines
+
+
+class CacheGenerations:
+    def __init__(self, store):
+        self.store, self.generations = store, {}
+
+    def invalidate(self, *caches):
+        if caches:
+            self.store.increment_many("cache_generations", caches)
+
+    def stale(self, cache):
+        generation = self.store.value("cache_generations", cache, 0)
+        if self.generations.get(cache, 0) == generation:
+            return False
+        self.generations[cache] = generation
+        return True
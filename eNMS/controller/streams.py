@@ -0,0 +1,55 @@
+from json import dumps
+from threading import BoundedSemaphore, Condition
+from time import sleep
+
+
+class RunStream:
+    def __init__(self, interval, heartbeat, max_idle, max_streams, poll_interval):
+        self.interval = interval
+        self.heartbeat = heartbeat
+        self.max_idle = max_idle
+        self.max_streams = max_streams
+        self.poll_interval = poll_interval
+        self.after_fork()
+
+    def after_fork(self):
+        self.condition = Condition()
+        self.streams = BoundedSemaphore(self.max_streams)
+        self.version = 0
+
+    def notify(self):
+        with self.condition:
+            self.version += 1
+            self.condition.notify_all()
+
+    def wait(self, version):
+        sleep(self.interval)
+        with self.condition:
+            if self.version == version:
+                self.condition.wait(self.heartbeat)
+            return self.version
+
+    @staticmethod
+    def flatten(state, path=()):
+        for key, value in list(state.items()):
+            if isinstance(value, dict):
+                yield from RunStream.flatten(value, (*path, str(key)))
+            else:
+                yield (*path, str(key)), value
+
+    def delta(self, sent_state, state):
+        delta = []
+        for path, value in self.flatten(state):
+            serialized_value = dumps(value, default=str)
+            if sent_state.get(path) != serialized_value:
+                sent_state[path] = serialized_value
+                delta.append([path, value])
+        return delta
+
+    @staticmethod
+    def event(name, data, id=None):
+        event_id = "" if id is None else f"id: {id}\n"
+        return f"event: {name}\n{event_id}data: {dumps(data, default=str)}\n\n"
+
+    def retry(self):
+        return f"retry: {int(self.poll_interval * 1000)}\n\n"
@@ -0,0 +1,82 @@
+from concurrent.futures import ThreadPoolExecutor
+from os import environ
+from pynetbox import api as netbox_api
+
+
+class InventorySync:
+    def __init__(self, session, workers, sources):
+        self.session = session
+        self.workers = workers
+        self.sources = sources
+
+    def netbox(self, address):
+        nb = netbox_api(address, token=environ.get("NETBOX_TOKEN"), threading=True)
+        nb.http_session = self.session
+        sites = {site.name: site for site in nb.dcim.sites.all()}
+        for device in nb.dcim.devices.all():
+            device_ip = device.primary_ip4 or device.primary_ip6
+            site = sites.get(getattr(device.site, "name", None))
+            yield {
+                "name": device.name,
+                "ip_address": str(device_ip).split("/")[0],
+                "subtype": str(device.device_role),
+                "model": str(device.device_type),
+                "location": str(device.site),
+                "vendor": str(device.device_type.manufacturer),
+                "operating_system": str(device.platform),
+                "longitude": getattr(site, "longitude", None),
+                "latitude": getattr(site, "latitude", None),
+            }
+
+    def librenms(self, address):
+        devices = self.session.get(
+            f"{address}/api/v0/devices",
+            headers={"X-Auth-Token": environ.get("LIBRENMS_TOKEN")},
+        ).json()["devices"]
+        for device in devices:
+            yield {
+                "name": device["hostname"],
+                "ip_address": device["ip"] or device["hostname"],
+                "model": device["hardware"],
+                "operating_system": device["os"],
+                "os_version": device["version"],
+                "location": device["location"],
+                "longitude": device["lng"],
+                "latitude": device["lat"],
+            }
+
+    def opennms(self, address, login, devices):
+        kwargs = {
+            "headers": {"Accept": "application/json"},
+            "auth": (login, environ.get("OPENNMS_PASSWORD")),
+        }
+        nodes = self.session.get(devices, **kwargs).json()["node"]
+
+        def interfaces(node):
+            url = f"{address}/nodes/{node['id']}/ipinterfaces"
+            return self.session.get(url, **kwargs).json()["ipInterface"]
+
+        with ThreadPoolExecutor(self.workers) as executor:
+            for node, node_interfaces in zip(nodes, executor.map(interfaces, nodes)):
+                ip_address = next(
+                    (
+                        interface["ipAddress"]
+                        for interface in node_interfaces
+                        if interface["snmpPrimary"] == "P"
+                    ),
+                    None,
+                )
+                if not ip_address:
+                    continue
+                yield {
+                    "name": node.get("label", node["id"]),
+                    "ip_address": ip_address,
+                    "description": node["assetRecord"].get("description", ""),
+                    "location": node["assetRecord"].get("building", ""),
+                    "vendor": node["assetRecord"].get("manufacturer", ""),
+                    "model": node["assetRecord"].get("modelNumber", ""),
+                    "operating_system": node.get("operatingSystem", ""),
+                    "os_version": node["assetRecord"].get("sysDescription", ""),
+                    "longitude": node["assetRecord"].get("longitude", 0.0),
+                    "latitude": node["assetRecord"].get("latitude", 0.0),
+                }
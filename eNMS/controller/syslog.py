@@ -1,30 +1,130 @@
+from datetime import datetime
+from logging import error, warning
+from queue import Full, Queue
+from re import compile, error as regex_error, escape
 from socketserver import BaseRequestHandler, UDPServer
-from threading import Thread
+from threading import Lock, Thread
 
-from eNMS.database.functions import fetch, fetch_all
+from eNMS.database import Session
+from eNMS.models import models
+
+backreference = compile(r"(?<!\\)(?:\\\\)*\\[1-9]|\(\?\(\d")
+
+
+class EventMatcher:
+    def __init__(self, generations):
+        self.lock, self.generations = Lock(), generations
+        self.devices = self.rules = self.prefilter = None
+
+    def after_fork(self):
+        self.lock = Lock()
+
+    def invalidate(self):
+        with self.lock:
+            self.devices = self.rules = self.prefilter = None
+
+    @staticmethod
+    def pattern(value, regex):
+        return value if regex else escape(value)
+
+    def build(self):
+        device, event = models["device"], models["event"]
+        devices = dict(Session.query(device.ip_address, device.name))
+        rules, patterns = [], []
+        for properties in Session.query(
+            event.service_id,
+            event.log_source,
+            event.log_source_regex,
+            event.log_content,
+            event.log_content_regex,
+        ):
+            service_id, source, source_regex, content, content_regex = properties
+            if not service_id:
+                continue
+            rules.append(
+                (
+                    service_id,
+                    compile(self.pattern(source or "", source_regex)),
+                    compile(self.pattern(content or "", content_regex)),
+                )
+            )
+            patterns.append(self.pattern(content or "", content_regex))
+        try:
+            prefilter = (
+                compile("|".join(f"(?:{pattern})" for pattern in patterns))
+                if all(patterns)
+                and not any(backreference.search(pattern) for pattern in patterns)
+                else None
+            )
+        except regex_error:
+            prefilter = None
+        with self.lock:
+            self.devices, self.rules, self.prefilter = devices, rules, prefilter
+
+    def match(self, address, content):
+        if self.generations.stale(("event_matcher",)) or self.rules is None:
+            self.build()
+        with self.lock:
+            devices, rules, prefilter = self.devices, self.rules, self.prefilter
+        if not rules or prefilter and not prefilter.search(content):
+            return []
+        source = devices.get(address, address)
+        return [
+            service_id
+            for service_id, source_pattern, content_pattern in rules
+            if source_pattern.search(source) and content_pattern.search(content)
+        ]
 
 
 class SyslogServer:
-    def __init__(self, ip_address, port):
-        self.ip_address = ip_address
+    def __init__(
+        self, address, port, queue_size, workers, dispatch, generations, writer=None
+    ):
+        self.address = address
         self.port = port
-        self.start()
+        self.queue = Queue(maxsize=queue_size)
+        self.workers = workers
+        self.dispatch = dispatch
+        self.writer = writer
+        self.matcher = EventMatcher(generations)
+        self.dropped = 0
 
     def start(self):
         UDPServer.allow_reuse_address = True
-        self.server = UDPServer((self.ip_address, self.port), SyslogUDPHandler)
-        th = Thread(target=self.server.serve_forever)
-        th.daemon = True
-        th.start()
+        self.server = UDPServer((self.address, self.port), SyslogUDPHandler)
+        self.server.syslog_server = self
+        for target in [self.server.serve_forever] + [self.worker] * self.workers:
+            th = Thread(target=target)
+            th.daemon = True
+            th.start()
+
+    def enqueue(self, address, data):
+        try:
+            self.queue.put_nowait((address, data))
+        except Full:
+            self.dropped += 1
+            if self.dropped % self.queue.maxsize == 1:
+                warning(f"Syslog Server: queue full, {self.dropped} messages dropped")
+
+    def process(self, address, data):
+        content = data.strip().decode("utf-8", "replace")
+        if self.writer:
+            self.writer.add(time=str(datetime.now()), source=address, content=content)
+        for service_id in self.matcher.match(address, content):
+            self.dispatch(service_id)
+
+    def worker(self):
+        while True:
+            message = self.queue.get()
+            try:
+                self.process(*message)
+            except Exception as exc:
+                error(f"Syslog Server: failed to process message ({exc})")
+            finally:
+                Session.remove()
+                self.queue.task_done()
 
 
 class SyslogUDPHandler(BaseRequestHandler):
     def handle(self):
-        address = self.client_address[0]
-        device = fetch("device", allow_none=True, ip_address=address)
-        properties = {
-            "source": device.name if device else address,
-            "content": str(bytes.decode(self.request[0].strip())),
-        }
-        for event in fetch_all("event"):
-            event.match_log(**properties)
+        self.server.syslog_server.enqueue(self.client_address[0], self.request[0])
@@ -0,0 +1,80 @@
+from concurrent.futures import ThreadPoolExecutor
+from cryptography.fernet import Fernet
+from logging import warning
+from threading import Lock
+from time import time
+
+from eNMS.properties import private_properties
+
+
+class SecretCache:
+    def __init__(self, client, cache_ttl, prefetch_workers, generations):
+        self.client = client
+        self.ttl = cache_ttl
+        self.prefetch_workers = prefetch_workers
+        self.generations = generations
+        self.fernet = Fernet(Fernet.generate_key())
+        self.secrets, self.lock = {}, Lock()
+
+    def after_fork(self):
+        self.lock = Lock()
+
+    @staticmethod
+    def path(table, name, property):
+        return f"secret/data/{table}/{name}/{property}"
+
+    def get(self, key):
+        if self.generations.stale(("vault", *key[:2])):
+            self.invalidate(*key[:2], share=False)
+        with self.lock:
+            expiry, token = self.secrets.get(key, (0, None))
+        if expiry < time():
+            return None
+        return self.fernet.decrypt(token).decode("utf-8")
+
+    def set(self, key, value):
+        token = self.fernet.encrypt(value.encode("utf-8"))
+        with self.lock:
+            self.secrets[key] = (time() + self.ttl, token)
+
+    def fetch(self, table, name, property):
+        data = self.client.read(self.path(table, name, property))
+        value = data["data"]["data"][property] if data else ""
+        self.set((table, name, property), value)
+        return value
+
+    def read(self, table, name, property):
+        value = self.get((table, name, property))
+        if value is None:
+            value = self.fetch(table, name, property)
+        return value
+
+    def write(self, table, name, property, value):
+        self.client.write(self.path(table, name, property), data={property: value})
+        self.set((table, name, property), value)
+        self.generations.invalidate(("vault", table, name))
+
+    def invalidate(self, table, name, share=True):
+        with self.lock:
+            for property in private_properties:
+                self.secrets.pop((table, name, property), None)
+        if share:
+            self.generations.invalidate(("vault", table, name))
+
+    def prefetch(self, table, names, properties=("password", "enable_password")):
+        keys = [
+            (table, name, property)
+            for name in set(names)
+            for property in properties
+            if self.get((table, name, property)) is None
+        ]
+        if not keys:
+            return
+        with ThreadPoolExecutor(max_workers=self.prefetch_workers) as executor:
+            list(executor.map(self.prefetch_secret, keys))
+
+    def prefetch_secret(self, key):
+        try:
+            self.fetch(*key)
+        except Exception as exc:
+            warning(f"Vault: failed to prefetch {self.path(*key)} ({exc})")
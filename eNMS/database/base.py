@@ -24,9 +24,7 @@ class AbstractBase(Base):
 
     def __getattribute__(self, property):
         if property in private_properties and app.config["vault"]["active"]:
-            path = f"secret/data/{self.__tablename__}/{self.name}/{property}"
-            data = app.vault_client.read(path)
-            return data["data"]["data"][property] if data else ""
+            return app.vault_cache.read(self.__tablename__, self.name, property)
         else:
             return super().__getattribute__(property)
 
@@ -35,10 +33,7 @@ class AbstractBase(Base):
             if not value:
                 return
             if app.config["vault"]["active"]:
-                app.vault_client.write(
-                    f"secret/data/{self.__tablename__}/{self.name}/{property}",
-                    data={property: value},
-                )
+                app.vault_cache.write(self.__tablename__, self.name, property, value)
             else:
                 super().__setattr__(property, value)
         else:
@@ -1,6 +1,10 @@
-from sqlalchemy import Column as SQLA_Column, PickleType, String, Text
+from json import dumps, loads
+from pickle import loads as pickle_loads
+from sqlalchemy import Column as SQLA_Column, LargeBinary, PickleType, String, Text
 from sqlalchemy.dialects.mysql.base import MSMediumBlob
 from sqlalchemy.ext.mutable import MutableDict, MutableList
+from sqlalchemy.types import TypeDecorator
+from zlib import compress, decompress
 
 from eNMS.config import config
 from eNMS.database import DIALECT
@@ -11,6 +15,28 @@ class CustomPickleType(PickleType):
         impl = MSMediumBlob
 
 
+class CompressedJSON(TypeDecorator):
+    impl = MSMediumBlob if DIALECT == "mysql" else LargeBinary
+
+    @staticmethod
+    def convert(value):
+        return list(value) if isinstance(value, (set, tuple)) else str(value)
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return compress(dumps(value, default=self.convert).encode("utf-8"))
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        elif value[:1] == b"\x80":
+            return pickle_loads(value)
+        return loads(decompress(value).decode("utf-8"))
+
+
+JSONDict = MutableDict.as_mutable(CompressedJSON)
+JSONList = MutableList.as_mutable(CompressedJSON)
 MutableDict = MutableDict.as_mutable(CustomPickleType)
 MutableList = MutableList.as_mutable(CustomPickleType)
 LargeString = Text(config["database"]["large_string_length"])
@@ -18,6 +44,8 @@ SmallString = String(config["database"]["small_string_length"])
 
 
 default_ctypes = {
+    JSONDict: {},
+    JSONList: [],
     MutableDict: {},
     MutableList: [],
     LargeString: "",
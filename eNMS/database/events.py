@@ -1,12 +1,16 @@
 from sqlalchemy import Boolean, event, Float, inspect, Integer, PickleType
 from sqlalchemy.orm.collections import InstrumentedList
+from sqlalchemy.sql.dml import Delete, Insert, Update
+from sqlalchemy.sql.elements import TextClause
 from sqlalchemy.types import JSON
 
-from eNMS.database import Base
+from eNMS.database import Base, engine, Session
 from eNMS.models import model_properties, models, property_types, relationships
 from eNMS.properties import private_properties
 from eNMS.properties.database import dont_track_changes
 
+matcher_tables = {"device", "event", "object"}
+
 
 @event.listens_for(Base, "mapper_configured", propagate=True)
 def model_inspection(mapper, cls):
@@ -77,15 +81,60 @@ def configure_events(app):
             name, changes = getattr(target, "name", target.id), " | ".join(changelog)
             app.log("info", f"UPDATE: {target.type} '{name}': ({changes})")
 
+    def flag_stale_caches(*caches):
+        Session.info.setdefault("stale_caches", set()).update(caches)
+
+    @event.listens_for(Session, "after_commit")
+    def share_cache_invalidation(session):
+        stale_caches = session.info.pop("stale_caches", set())
+        if "changed_tables" in session.info:
+            changed_tables = session.info.pop("changed_tables")
+            tables = app.invalidate_table_cache(changed_tables)
+            stale_caches.update(("table", table) for table in tables)
+            if changed_tables is None or matcher_tables & set(changed_tables):
+                stale_caches.add(("event_matcher",))
+        app.cache_generations.invalidate(*stale_caches)
+
+    @event.listens_for(engine, "after_execute")
+    def flag_changed_table(connection, statement, *args):
+        if isinstance(statement, (Insert, Delete, Update)):
+            tables = Session.info.setdefault("changed_tables", {})
+            if tables is not None:
+                name, update = statement.table.name, isinstance(statement, Update)
+                tables[name] = tables.get(name, True) and update
+        elif isinstance(statement, (str, TextClause)):
+            keyword = str(statement).lstrip()[:7].upper()
+            if keyword.startswith(("INSERT", "UPDATE", "DELETE", "REPLACE")):
+                Session.info["changed_tables"] = None
+
+    @event.listens_for(models["workflow_edge"], "after_insert")
+    @event.listens_for(models["workflow_edge"], "after_delete")
+    def invalidate_workflow_plan(mapper, connection, target):
+        app.workflow_plans.pop(target.workflow_id, None)
+        flag_stale_caches(("workflow_plans", str(target.workflow_id)))
+
+    @event.listens_for(models["pool"], "after_insert")
+    @event.listens_for(models["pool"], "after_delete")
+    def invalidate_pool_index(mapper, connection, target):
+        app.pool_index.invalidate()
+        flag_stale_caches(("pool_index",))
+
+    @event.listens_for(models["pool"], "after_update")
+    def update_pool_index(mapper, connection, target):
+        state = inspect(target)
+        properties = ["operator", "never_update"] + [
+            column.key for column in models["abstract_pool"].__table__.columns
+        ]
+        if any(state.get_history(key, True).has_changes() for key in properties):
+            app.pool_index.invalidate()
+            flag_stale_caches(("pool_index",))
+
     if app.config["vault"]["active"]:
 
         @event.listens_for(models["service"].name, "set", propagate=True)
         def vault_update(target, new_value, old_value, *_):
-            path = f"secret/data/{target.type}/{old_value}/password"
-            data = app.vault_client.read(path)
-            if not data:
+            password = app.vault_cache.read(target.type, old_value, "password")
+            if not password:
                 return
-            app.vault_client.write(
-                f"secret/data/{target.type}/{new_value}/password",
-                data={"password": data["data"]["data"]["password"]},
-            )
+            app.vault_cache.write(target.type, new_value, "password", password)
+            app.vault_cache.invalidate(target.type, old_value)
@@ -1,5 +1,6 @@
 from re import search
 from sqlalchemy import func
+from sqlalchemy.orm import aliased
 
 from eNMS.database import Session
 from eNMS.models import models
@@ -30,6 +31,22 @@ def get_query_count(query):
     return query.session.execute(count_query).scalar()
 
 
+def query_properties(model, properties):
+    cls, columns, joins = models[model], [], []
+    for property in properties:
+        if property in ("source_name", "destination_name"):
+            device = aliased(models["device"])
+            endpoint = getattr(cls, f"{property.split('_')[0]}_id")
+            columns.append(device.name)
+            joins.append((device, endpoint == device.id))
+        else:
+            columns.append(getattr(cls, property))
+    query = Session.query(*columns)
+    for device, condition in joins:
+        query = query.outerjoin(device, condition)
+    return query
+
+
 def objectify(model, object_list):
     return [fetch(model, id=object_id) for object_id in object_list]
 
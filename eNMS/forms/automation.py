@@ -54,6 +54,9 @@ class ServiceForm(BaseForm):
     number_of_retries = IntegerField("Number of retries", default=0)
     time_between_retries = IntegerField("Time between retries (in seconds)", default=10)
     maximum_runs = IntegerField("Maximum number of runs", default=1)
+    retention_runs = IntegerField("Number of runs to keep", default=0)
+    retention_days = IntegerField("Number of days to keep", default=0)
+    retention_failures_only = BooleanField("Only keep failed runs")
     skip = BooleanField("Skip")
     skip_query = PythonField("Skip Query (Python)")
     vendor = StringField("Vendor")
@@ -71,6 +74,15 @@ class ServiceForm(BaseForm):
     result_postprocessing = CodeField(widget=TextArea(), render_kw={"rows": 8})
     multiprocessing = BooleanField("Multiprocessing")
     max_processes = IntegerField("Maximum number of processes", default=50)
+    multiprocessing_mode = SelectField(
+        "Multiprocessing Mode",
+        choices=(
+            ("thread", "Thread pool"),
+            ("process", "Process pool"),
+            ("asyncio", "Asyncio event loop"),
+        ),
+    )
+    distributed = BooleanField("Distribute devices across the cluster")
     conversion_method = SelectField(
         choices=(
             ("none", "No conversion"),
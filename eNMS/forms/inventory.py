@@ -151,3 +151,7 @@ class ExportForm(BaseForm):
     action = "exportTopology"
     form_type = HiddenField(default="excel_export")
     export_filename = StringField("Filename")
+    export_format = SelectField(
+        "Export Format",
+        choices=(("xls", "XLS"), ("xlsx", "XLSX"), ("csv", "CSV (zip archive)")),
+    )
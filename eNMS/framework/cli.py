@@ -33,6 +33,12 @@ def configure_cli(flask_app):
         Session.commit()
         echo(app.str_dict(device))
 
+    @flask_app.cli.command(name="convert_payloads")
+    @option("--batch-size", default=1000)
+    def convert_payloads(batch_size):
+        converted_rows = app.convert_pickled_payloads(batch_size)
+        echo(f"{converted_rows} results and runs converted from pickle to JSON.")
+
     @flask_app.cli.command(name="run_service")
     @argument("name")
     @option("--devices")
@@ -1,5 +1,4 @@
-from datetime import datetime
-from flask import request
+from flask import request, Response, stream_with_context
 from flask_restful import abort, Api, Resource
 from logging import info
 from psutil import cpu_percent
@@ -97,7 +96,8 @@ class GetResult(Resource):
 
     def get(self, name, runtime):
         service = fetch("service", name=name)
-        return fetch("result", service_id=service.id, runtime=runtime).result
+        result = fetch("result", service_id=service.id, runtime=runtime)
+        return result.result_with_logs
 
 
 class UpdateInstance(Resource):
@@ -158,19 +158,24 @@ class RunService(Resource):
             data.update({"devices": devices, "pools": pools})
         data["runtime"] = runtime = app.get_time()
         if handle_asynchronously:
-            app.scheduler.add_job(
-                id=runtime,
-                func=app.run,
-                run_date=datetime.now(),
-                args=[service.id],
-                kwargs=data,
-                trigger="date",
-            )
+            app.schedule_run(service.id, **data)
             return {"errors": errors, "runtime": runtime}
         else:
             return {**app.run(service.id, **data), "errors": errors}
 
 
+class RunShard(Resource):
+    decorators = [auth.login_required]
+
+    def post(self):
+        kwargs = request.get_json(force=True)
+        if not fetch("run", allow_none=True, id=kwargs["run_id"]):
+            return abort(503, message=f"Run {kwargs['run_id']} not found.")
+        result = app.run_shard(**kwargs)
+        Session.commit()
+        return result
+
+
 class Topology(Resource):
     decorators = [auth.login_required]
 
@@ -183,8 +188,20 @@ class Topology(Resource):
                 }
             )
         else:
-            app.export_topology(**request.get_json(force=True))
-            return "Topology Export successfully executed."
+            kwargs = request.get_json(force=True)
+            if not kwargs.pop("stream", False):
+                app.export_topology(**kwargs)
+                return "Topology Export successfully executed."
+            extension, data = app.stream_topology(
+                kwargs.get("export_format", "xls"),
+                kwargs.get("object_types", ("device", "link")),
+            )
+            filename = f"{kwargs.get('export_filename', 'topology')}.{extension}"
+            return Response(
+                stream_with_context(data),
+                mimetype=app.topology_export.formats[extension],
+                headers={"Content-Disposition": f"attachment; filename={filename}"},
+            )
 
 
 def configure_rest_api(flask_app):
@@ -194,6 +211,7 @@ def configure_rest_api(flask_app):
     api.add_resource(CreatePool, "/rest/create_pool")
     api.add_resource(Heartbeat, "/rest/is_alive")
     api.add_resource(RunService, "/rest/run_service")
+    api.add_resource(RunShard, "/rest/run_shard")
     api.add_resource(Query, "/rest/query/<string:cls>")
     api.add_resource(UpdateInstance, "/rest/instance/<string:cls>")
     api.add_resource(GetInstance, "/rest/instance/<string:cls>/<string:name>")
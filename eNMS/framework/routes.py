@@ -6,10 +6,12 @@ from flask import (
     render_template,
     request,
     session,
+    stream_with_context,
     url_for,
 )
 from flask_login import current_user, login_user, logout_user
 from functools import wraps
+from gzip import compress
 from logging import info
 from os import listdir
 from werkzeug.wrappers import Response
@@ -176,6 +178,35 @@ def download_output(id):
     )
 
 
+@blueprint.after_request
+def compress_response(response):
+    if (
+        response.direct_passthrough
+        or response.mimetype != "application/json"
+        or "gzip" not in request.headers.get("Accept-Encoding", "")
+        or response.content_length < app.config["app"]["compression_threshold"]
+    ):
+        return response
+    response.set_data(compress(response.get_data()))
+    response.headers["Content-Encoding"] = "gzip"
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
+
+
+@blueprint.route("/stream_run_state/<int:service_id>/<runtime>")
+@monitor_requests
+def stream_run_state(service_id, runtime):
+    return Response(
+        stream_with_context(
+            app.stream_run_state(
+                service_id, runtime, request.headers.get("Last-Event-ID", 0)
+            )
+        ),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @blueprint.route("/<path:_>")
 @monitor_requests
 def get_requests_sink(_):
@@ -66,6 +66,8 @@ class Service(AbstractBase):
     maximum_runs = Column(Integer, default=1)
     multiprocessing = Column(Boolean, default=False)
     max_processes = Column(Integer, default=5)
+    multiprocessing_mode = Column(SmallString, default="thread")
+    distributed = Column(Boolean, default=False)
     conversion_method = Column(SmallString, default="none")
     validation_method = Column(SmallString, default="none")
     content_match = Column(LargeString, default="")
@@ -74,6 +76,9 @@ class Service(AbstractBase):
     negative_logic = Column(Boolean, default=False)
     delete_spaces_before_matching = Column(Boolean, default=False)
     run_method = Column(SmallString, default="per_device")
+    retention_runs = Column(Integer, default=0)
+    retention_days = Column(Integer, default=0)
+    retention_failures_only = Column(Boolean, default=False)
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -118,7 +123,9 @@ class Service(AbstractBase):
             onclick = f"switchToWorkflow('{self.id}')"
             rows[0] = f"""<b><a href="#" onclick="{onclick}">{rows[0]}</a></b>"""
         return rows + [
-            f"Running" if app.service_db[self.id]["runs"] else "Idle",
+            "Running"
+            if app.run_store.value("service_runs", (str(self.id),), 0)
+            else "Idle",
             f"""
             <ul class="pagination pagination-lg" style="margin: 0px; width: 350px">
           <li>
@@ -1,10 +1,13 @@
+from asyncio import gather, get_event_loop, new_event_loop, Semaphore
+from asyncio import sleep as async_sleep
 from builtins import __dict__ as builtins
-from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from datetime import datetime
-from functools import partial
+from functools import lru_cache, partial
 from json import dumps, loads
 from json.decoder import JSONDecodeError
+from multiprocessing import get_context
 from multiprocessing.pool import ThreadPool
 from napalm import get_network_driver
 from netmiko import ConnectHandler
@@ -17,20 +20,22 @@ from scp import SCPClient
 from slackclient import SlackClient
 from sqlalchemy import Boolean, ForeignKey, Integer
 from sqlalchemy.ext.associationproxy import association_proxy
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 from time import sleep
 from traceback import format_exc
 from xmltodict import parse
 from xml.parsers.expat import ExpatError
 
 from eNMS import app
-from eNMS.database import Session
+from eNMS.database import engine, Session
 from eNMS.database.associations import run_pool_table, run_device_table
-from eNMS.database.dialect import Column, MutableDict, SmallString
+from eNMS.database.dialect import Column, JSONDict, JSONList, SmallString
 from eNMS.database.functions import factory, fetch
 from eNMS.database.base import AbstractBase
 from eNMS.models import models
 
+substitution_regex = compile("{{(.*?)}}")
+
 
 class Result(AbstractBase):
 
@@ -40,7 +45,8 @@ class Result(AbstractBase):
     success = Column(Boolean, default=False)
     runtime = Column(SmallString)
     duration = Column(SmallString)
-    result = Column(MutableDict)
+    result = deferred(Column(JSONDict))
+    logs = deferred(Column(JSONList, default=None))
     run_id = Column(Integer, ForeignKey("run.id"))
     run = relationship("Run", back_populates="results", foreign_keys="Result.run_id")
     parent_runtime = Column(SmallString)
@@ -63,6 +69,12 @@ class Result(AbstractBase):
     def __getitem__(self, key):
         return self.result[key]
 
+    @property
+    def result_with_logs(self):
+        if self.logs is None:
+            return self.result
+        return {**self.result, "logs": self.logs}
+
     def __init__(self, **kwargs):
         self.success = kwargs["result"]["success"]
         self.runtime = kwargs["result"]["runtime"]
@@ -88,6 +100,25 @@ class Result(AbstractBase):
         ]
 
 
+class ResultSummary(AbstractBase):
+
+    __tablename__ = type = "result_summary"
+    private = True
+    id = Column(Integer, primary_key=True)
+    day = Column(SmallString)
+    success_count = Column(Integer, default=0)
+    failure_count = Column(Integer, default=0)
+    device_id = Column(Integer, ForeignKey("device.id", ondelete="cascade"))
+    device = relationship("Device", foreign_keys="ResultSummary.device_id")
+    device_name = association_proxy("device", "name")
+    service_id = Column(Integer, ForeignKey("service.id", ondelete="cascade"))
+    service = relationship("Service", foreign_keys="ResultSummary.service_id")
+    service_name = association_proxy("service", "name")
+
+    def __repr__(self):
+        return f"{self.service_name} on {self.device_name} ({self.day})"
+
+
 class Run(AbstractBase):
 
     __tablename__ = type = "run"
@@ -96,7 +127,7 @@ class Run(AbstractBase):
     restart_run_id = Column(Integer, ForeignKey("run.id"))
     restart_run = relationship("Run", uselist=False, foreign_keys=restart_run_id)
     creator = Column(SmallString, default="admin")
-    properties = Column(MutableDict)
+    properties = Column(JSONDict)
     success = Column(Boolean, default=False)
     status = Column(SmallString, default="Running")
     runtime = Column(SmallString)
@@ -121,7 +152,7 @@ class Run(AbstractBase):
     workflow_name = association_proxy("workflow", "name")
     task_id = Column(Integer, ForeignKey("task.id"))
     task = relationship("Task", foreign_keys="Run.task_id")
-    state = Column(MutableDict)
+    state = Column(JSONDict)
     results = relationship("Result", back_populates="run", cascade="all, delete-orphan")
 
     def __init__(self, **kwargs):
@@ -170,22 +201,42 @@ class Run(AbstractBase):
         </ul>"""
         ]
 
+    @property
+    def state_path(self):
+        if self.runtime == self.parent_runtime:
+            return ()
+        else:
+            return ("services", str(self.service.id))
+
     @property
     def run_state(self):
         if self.state:
             return self.state
-        elif self.runtime == self.parent_runtime:
-            return app.run_db[self.runtime]
-        else:
-            return app.run_db[self.parent_runtime]["services"][self.service.id]
+        return app.run_store.value(self.parent_runtime, self.state_path, {})
 
     @property
     def edge_state(self):
-        return app.run_db[self.parent_runtime]["edges"]
+        return app.run_store.value(self.parent_runtime, ("edges",), {})
 
     @property
     def stop(self):
-        return self.run_state["status"] == "stop"
+        if self.state:
+            return self.state["status"] == "stop"
+        path = (*self.state_path, "status")
+        return app.run_store.value(self.parent_runtime, path) == "stop"
+
+    def set_state(self, path, value):
+        app.run_store.set(self.parent_runtime, (*self.state_path, *path), value)
+
+    def increment_state(self, path, value=1):
+        app.run_store.increment(self.parent_runtime, (*self.state_path, *path), value)
+
+    def increment_edge_state(self, edge_id, value=1):
+        app.run_store.increment(self.parent_runtime, ("edges", str(edge_id)), value)
+
+    @property
+    def event_loop_support(self):
+        return hasattr(self.service, "async_job") and not self.iteration_values
 
     @property
     def progress(self):
@@ -245,7 +296,7 @@ class Run(AbstractBase):
             "summary": {"success": [], "failure": []},
         }
         if self.service.type == "workflow":
-            state.update({"edges": defaultdict(int), "services": defaultdict(dict)})
+            state.update({"edges": {}, "services": {}})
             state["progress"]["service"] = {
                 "total": len(self.service.services),
                 "success": 0,
@@ -253,22 +304,18 @@ class Run(AbstractBase):
                 "skipped": 0,
             }
         if self.runtime == self.parent_runtime:
-            if self.runtime in app.run_db:
-                return
-            app.run_db[self.runtime] = state
+            app.run_store.create(self.runtime, state)
         else:
-            service_states = app.run_db[self.parent_runtime]["services"]
-            if self.service.id not in service_states:
-                service_states[self.service.id] = state
+            app.run_store.setdefault(self.parent_runtime, self.state_path, state)
 
     def run(self, payload=None):
         self.init_state()
-        self.run_state["status"] = "Running"
+        self.set_state(("status",), "Running")
         start = datetime.now().replace(microsecond=0)
         if payload is None:
             payload = self.service.initial_payload
         try:
-            app.service_db[self.service.id]["runs"] += 1
+            app.run_store.increment("service_runs", (str(self.service.id),))
             Session.commit()
             results = self.device_run(payload)
         except Exception:
@@ -282,20 +329,24 @@ class Run(AbstractBase):
             results = {"success": False, "runtime": self.runtime, "result": result}
         finally:
             Session.commit()
-            results["summary"] = self.run_state.get("summary", None)
-            self.status = "Aborted" if self.stop else "Completed"
-            self.run_state["status"] = self.status
-            if self.run_state["success"] is not False:
-                self.success = self.run_state["success"] = results["success"]
+            app.result_writer.flush()
+            state = self.run_state
+            results["summary"] = state.get("summary", None)
+            self.status = "Aborted" if state["status"] == "stop" else "Completed"
+            self.set_state(("status",), self.status)
+            if state["success"] is not False:
+                self.success = results["success"]
+                self.set_state(("success",), self.success)
             if self.send_notification:
                 results = self.notify(results)
-            app.service_db[self.service.id]["runs"] -= 1
+            app.run_store.increment("service_runs", (str(self.service.id),), -1)
             results["duration"] = self.duration = str(
                 datetime.now().replace(microsecond=0) - start
             )
             results["logs"] = app.run_logs.pop(self.runtime, [])
             if self.runtime == self.parent_runtime:
-                self.state = results["state"] = app.run_db.pop(self.runtime)
+                app.connection_pool.release(self.runtime)
+                self.state = results["state"] = app.run_store.pop(self.runtime)
             if self.task and not self.task.frequency:
                 self.task.is_active = False
             results["properties"] = {
@@ -308,7 +359,9 @@ class Run(AbstractBase):
                 or self.run_method == "once"
             ):
                 self.create_result(results)
+            app.result_writer.flush()
             Session.commit()
+            app.run_stream.notify()
         return results
 
     @staticmethod
@@ -317,6 +370,59 @@ class Run(AbstractBase):
         device = fetch("device", id=device_id)
         run = fetch("run", runtime=runtime)
         results.append(run.get_results(payload, device))
+        Session.commit()
+
+    @staticmethod
+    def init_process():
+        Session.remove()
+        app.after_fork()
+
+    @staticmethod
+    def get_device_process_result(args):
+        device_id, run_id, payload = args
+        device, run = fetch("device", id=device_id), fetch("run", id=run_id)
+        results = run.run_device_job(payload, device)
+        run.close_device_connection(device)
+        Session.commit()
+        return results, app.run_logs.pop(run.parent_runtime, [])
+
+    def process_pool_run(self, payload, processes, devices):
+        process_args = [(device.id, self.id, payload) for device in devices]
+        Session.commit()
+        engine.dispose()
+        with get_context("fork").Pool(processes, self.init_process) as pool:
+            process_results = pool.map(self.get_device_process_result, process_args)
+        results = []
+        for device, (device_results, logs) in zip(devices, process_results):
+            app.run_logs[self.parent_runtime].extend(logs)
+            results.append(self.register_results(device_results, device))
+        return results
+
+    def event_loop_run(self, payload, processes, devices):
+        loop, executor = new_event_loop(), ThreadPoolExecutor(processes)
+        loop.set_default_executor(executor)
+        self.executor_sessions = set()
+        try:
+            results = loop.run_until_complete(
+                self.async_device_results(payload, processes, devices)
+            )
+        finally:
+            loop.close()
+            executor.shutdown()
+            for session in self.executor_sessions:
+                session.close()
+        Session.commit()
+        return results
+
+    async def async_device_results(self, payload, processes, devices):
+        semaphore = Semaphore(processes)
+
+        async def device_results(device):
+            async with semaphore:
+                results = await self.async_run_device_job(payload, device)
+            return self.register_results(results, device)
+
+        return await gather(*(device_results(device) for device in devices))
 
     def device_iteration(self, payload, device):
         derived_devices = self.compute_devices_from_query(
@@ -339,48 +445,134 @@ class Run(AbstractBase):
 
     def device_run(self, payload):
         self.devices, success = self.compute_devices(payload), True
+        if self.devices and app.config["vault"]["active"]:
+            app.vault_cache.prefetch("device", [device.name for device in self.devices])
         if self.run_method != "per_device":
             return self.get_results(payload)
         else:
-            self.run_state["progress"]["device"]["total"] += len(self.devices)
+            self.increment_state(("progress", "device", "total"), len(self.devices))
             if self.iteration_devices and not self.parent_device:
                 success = all(
                     self.device_iteration(payload, device) for device in self.devices
                 )
                 return {"success": success, "runtime": self.runtime}
-            if self.multiprocessing and len(self.devices) > 1:
-                results = []
-                processes = min(len(self.devices), self.max_processes)
-                process_args = [
-                    (device.id, self.runtime, payload, results)
-                    for device in self.devices
-                ]
-                pool = ThreadPool(processes=processes)
-                pool.map(self.get_device_result, process_args)
-                pool.close()
-                pool.join()
+            if (
+                self.distributed
+                and app.cluster.active
+                and self.service.type != "workflow"
+                and len(self.devices) > 1
+            ):
+                results = self.distributed_run(payload)
             else:
-                results = [self.get_results(payload, device) for device in self.devices]
+                results = self.devices_run(payload, self.devices)
             return {
                 "success": all(result["success"] for result in results),
                 "runtime": self.runtime,
             }
 
+    def devices_run(self, payload, devices):
+        if self.multiprocessing and len(devices) > 1:
+            processes = min(len(devices), self.max_processes)
+            if self.multiprocessing_mode == "process":
+                return self.process_pool_run(payload, processes, devices)
+            elif self.multiprocessing_mode == "asyncio" and self.event_loop_support:
+                return self.event_loop_run(payload, processes, devices)
+            results = []
+            process_args = [
+                (device.id, self.runtime, payload, results) for device in devices
+            ]
+            pool = ThreadPool(processes=processes)
+            pool.map(self.get_device_result, process_args)
+            pool.close()
+            pool.join()
+            return results
+        else:
+            return [self.get_results(payload, device) for device in devices]
+
+    def distributed_run(self, payload):
+        shards = app.cluster.shard(self.devices, app.cluster.servers())
+        user = fetch("user", allow_none=True, name=self.creator)
+        if not user:
+            self.log("warning", "Run creator not found: devices will run locally")
+            return self.devices_run(payload, self.devices)
+        Session.commit()
+        local_devices, remote_shards, results = [], [], []
+        with ThreadPoolExecutor(max(len(shards), 1)) as executor:
+            for address, devices in shards:
+                if not address:
+                    local_devices.extend(devices)
+                    continue
+                self.log("info", f"Sending {len(devices)} devices to {address}")
+                future = executor.submit(
+                    app.cluster.run_shard,
+                    address,
+                    (user.name, user.password),
+                    self.id,
+                    [device.id for device in devices],
+                    payload,
+                )
+                remote_shards.append((address, devices, future))
+            results.extend(self.devices_run(payload, local_devices))
+            for address, devices, future in remote_shards:
+                try:
+                    shard = future.result()
+                except Exception as exc:
+                    self.log("error", f"{address} failed ({exc})")
+                    for device in devices:
+                        shard_failure = {
+                            "runtime": app.get_time(),
+                            "success": False,
+                            "result": f"Shard sent to {address} failed ({exc})",
+                            "duration": "0:00:00",
+                        }
+                        results.append(self.register_results(shard_failure, device))
+                    continue
+                if shard is None:
+                    self.log("warning", f"{address} did not start: running locally")
+                    results.extend(self.devices_run(payload, devices))
+                    continue
+                app.run_logs[self.parent_runtime].extend(shard["logs"])
+                for device, device_results in zip(devices, shard["results"]):
+                    results.append(self.register_results(device_results, device))
+        return results
+
+    @staticmethod
+    def get_device_shard_result(args):
+        device_id, run_id, payload = args
+        try:
+            device, run = fetch("device", id=device_id), fetch("run", id=run_id)
+            return run.run_device_job(payload, device)
+        finally:
+            Session.commit()
+
+    def run_shard(self, payload, device_ids):
+        processes = min(len(device_ids), self.max_processes)
+        pool = ThreadPool(processes=processes if self.multiprocessing else 1)
+        results = pool.map(
+            self.get_device_shard_result,
+            [(device_id, self.id, payload) for device_id in device_ids],
+        )
+        pool.close()
+        pool.join()
+        app.connection_pool.release(self.parent_runtime)
+        return {"results": results, "logs": app.run_logs.pop(self.parent_runtime, [])}
+
     def create_result(self, results, device=None):
-        self.success = results["success"]
-        result_kw = {
-            "run": self,
-            "result": results,
-            "service": self.service_id,
-            "parent_runtime": self.parent_runtime,
-        }
-        if self.workflow_id:
-            result_kw["workflow"] = self.workflow_id
-        if self.parent_device_id:
-            result_kw["parent_device"] = self.parent_device_id
-        if device:
-            result_kw["device"] = device.id
-        factory("result", **result_kw)
+        if not device:
+            self.success = results["success"]
+        app.result_writer.add(
+            success=results["success"],
+            runtime=results["runtime"],
+            duration=results["duration"],
+            result={key: value for key, value in results.items() if key != "logs"},
+            logs=results.get("logs"),
+            run_id=self.id,
+            parent_runtime=self.parent_runtime,
+            service_id=self.service_id,
+            workflow_id=self.workflow_id,
+            parent_device_id=self.parent_device_id,
+            device_id=device.id if device else None,
+        )
 
     def run_service_job(self, payload, device):
         args = (device,) if device else ()
@@ -389,38 +581,63 @@ class Run(AbstractBase):
                 if retry:
                     self.log("error", f"RETRY n°{retry}", device)
                 results = self.service.job(self, payload, *args)
-                if device and (
-                    getattr(self, "close_connection", False)
-                    or self.runtime == self.parent_runtime
-                ):
+                if device and getattr(self, "close_connection", False):
                     self.close_device_connection(device)
-                self.convert_result(results)
-                try:
-                    self.eval(
-                        self.service.result_postprocessing, function="exec", **locals()
-                    )
-                except SystemExit:
-                    pass
-                if "success" not in results:
-                    results["success"] = True
-                if results["success"] and self.validation_method != "none":
-                    self.validate_result(results, payload, device)
+                elif device and self.runtime == self.parent_runtime:
+                    self.release_device_connection(device)
+                self.process_results(results, payload, device)
                 if results["success"]:
                     return results
                 elif retry < self.number_of_retries:
                     sleep(self.time_between_retries)
             except Exception:
-                result = (
-                    f"Running {self.service.type} '{self.service.name}'"
-                    " raised the following exception:\n"
-                    f"{chr(10).join(format_exc().splitlines())}\n\n"
-                    "Run aborted..."
-                )
-                self.log("error", result, device)
-                return {"success": False, "result": result}
+                return self.job_exception(device)
         return results
 
+    async def async_run_service_job(self, payload, device):
+        for retry in range(self.number_of_retries + 1):
+            try:
+                if retry:
+                    self.log("error", f"RETRY n°{retry}", device)
+                results = await self.service.async_job(self, payload, device)
+                if getattr(self, "close_connection", False):
+                    await self.in_executor(Run.close_device_connection, device)
+                elif self.runtime == self.parent_runtime:
+                    await self.in_executor(Run.release_device_connection, device)
+                self.process_results(results, payload, device)
+                if results["success"]:
+                    return results
+                elif retry < self.number_of_retries:
+                    await async_sleep(self.time_between_retries)
+            except Exception:
+                return self.job_exception(device)
+        return results
+
+    def job_exception(self, device):
+        result = (
+            f"Running {self.service.type} '{self.service.name}'"
+            " raised the following exception:\n"
+            f"{chr(10).join(format_exc().splitlines())}\n\n"
+            "Run aborted..."
+        )
+        self.log("error", result, device)
+        return {"success": False, "result": result}
+
+    def process_results(self, results, payload, device):
+        self.convert_result(results)
+        try:
+            self.eval(self.service.result_postprocessing, function="exec", **locals())
+        except SystemExit:
+            pass
+        if "success" not in results:
+            results["success"] = True
+        if results["success"] and self.validation_method != "none":
+            self.validate_result(results, payload, device)
+
     def get_results(self, payload, device=None):
+        return self.register_results(self.run_device_job(payload, device), device)
+
+    def run_device_job(self, payload, device=None):
         self.log("info", "STARTING", device)
         start = datetime.now().replace(microsecond=0)
         results = {"runtime": app.get_time(), "logs": []}
@@ -448,12 +665,30 @@ class Run(AbstractBase):
             )
             self.log("error", chr(10).join(format_exc().splitlines()), device)
         results["duration"] = str(datetime.now().replace(microsecond=0) - start)
+        return results
+
+    async def async_run_device_job(self, payload, device):
+        self.log("info", "STARTING", device)
+        start = datetime.now().replace(microsecond=0)
+        results = {"runtime": app.get_time(), "logs": []}
+        try:
+            results.update(await self.async_run_service_job(payload, device))
+        except Exception:
+            results.update(
+                {"success": False, "result": chr(10).join(format_exc().splitlines())}
+            )
+            self.log("error", chr(10).join(format_exc().splitlines()), device)
+        results["duration"] = str(datetime.now().replace(microsecond=0) - start)
+        return results
+
+    def register_results(self, results, device=None):
         if device:
             status = "success" if results["success"] else "failure"
-            self.run_state["progress"]["device"][status] += 1
-            self.run_state["summary"][status].append(device.name)
+            self.increment_state(("progress", "device", status))
+            app.run_store.append(
+                self.parent_runtime, (*self.state_path, "summary", status), device.name
+            )
             self.create_result(results, device)
-        Session.commit()
         self.log("info", "FINISHED", device)
         return results
 
@@ -463,6 +698,7 @@ class Run(AbstractBase):
             log += f" - DEVICE {device.name}"
         log += f" : {content}"
         app.run_logs[self.parent_runtime].append(log)
+        app.run_stream.notify()
 
     def build_notification(self, results):
         notification = {
@@ -675,18 +911,47 @@ class Run(AbstractBase):
             **locals,
         }
 
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def compile_code(source, mode="eval", filename="<string>"):
+        if mode == "eval":
+            source = source.lstrip(" \t")
+        return builtins["compile"](source, filename, mode)
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def compile_template(template):
+        segments = substitution_regex.split(template)
+        if len(segments) == 1:
+            return None
+        return tuple(
+            Run.compile_code(segment) if index % 2 else segment
+            for index, segment in enumerate(segments)
+        )
+
     def eval(_self, query, function="eval", **locals):  # noqa: N805
+        if isinstance(query, str):
+            query = _self.compile_code(query, function)
         return builtins[function](query, _self.python_code_kwargs(**locals))
 
     def sub(self, input, variables):
-        r = compile("{{(.*?)}}")
+        kwargs = None
 
-        def replace(match):
-            return str(self.eval(match.group()[2:-2], **variables))
+        def render(template):
+            nonlocal kwargs
+            segments = self.compile_template(template)
+            if not segments:
+                return template
+            if kwargs is None:
+                kwargs = self.python_code_kwargs(**variables)
+            return "".join(
+                str(eval(segment, kwargs)) if index % 2 else segment
+                for index, segment in enumerate(segments)
+            )
 
         def rec(input):
             if isinstance(input, str):
-                return r.sub(replace, input)
+                return render(input)
             elif isinstance(input, list):
                 return [rec(x) for x in input]
             elif isinstance(input, dict):
@@ -717,14 +982,27 @@ class Run(AbstractBase):
             self.log("error", f"Failed to honor the config mode {exc}")
         return connection
 
+    def connection_key(self, library, device, driver, username, password):
+        return (
+            library,
+            device.name,
+            device.ip_address,
+            device.port,
+            driver,
+            username,
+            hash(password),
+        )
+
     def netmiko_connection(self, device):
-        connection = self.get_or_close_connection("netmiko", device)
+        username, password = self.get_credentials(device)
+        driver = device.netmiko_driver if self.use_device_driver else self.driver
+        key = self.connection_key("netmiko", device, driver, username, password)
+        connection = self.get_or_close_connection(key, device)
         if connection:
             self.log("info", "Using cached Netmiko connection", device)
             return self.update_netmiko_connection(connection)
         self.log("info", "Opening new Netmiko connection", device)
-        username, password = self.get_credentials(device)
-        driver = device.netmiko_driver if self.use_device_driver else self.driver
+        app.connection_pool.make_room()
         netmiko_connection = ConnectHandler(
             device_type=driver,
             ip=device.ip_address,
@@ -740,27 +1018,49 @@ class Run(AbstractBase):
             netmiko_connection.enable()
         if self.config_mode:
             netmiko_connection.config_mode()
-        app.connections_cache["netmiko"][self.parent_runtime][
-            device.name
-        ] = netmiko_connection
+        app.connection_pool.add(key, self.parent_runtime, netmiko_connection)
         return netmiko_connection
 
+    async def in_executor(self, function, device, *args):
+        return await get_event_loop().run_in_executor(
+            None,
+            self.executor_job,
+            function,
+            self.id,
+            device.id,
+            args,
+            self.executor_sessions,
+        )
+
+    @staticmethod
+    def executor_job(function, run_id, device_id, args, sessions):
+        sessions.add(Session())
+        run = Session.query(models["run"]).get(run_id)
+        device = Session.query(models["device"]).get(device_id)
+        return function(run, device, *args)
+
+    async def async_netmiko_connection(self, device):
+        return await self.in_executor(Run.netmiko_connection, device)
+
+    async def async_napalm_connection(self, device):
+        return await self.in_executor(Run.napalm_connection, device)
+
     def napalm_connection(self, device):
-        connection = self.get_or_close_connection("napalm", device)
+        username, password = self.get_credentials(device)
+        driver = device.napalm_driver if self.use_device_driver else self.driver
+        key = self.connection_key("napalm", device, driver, username, password)
+        connection = self.get_or_close_connection(key, device)
         if connection:
             self.log("info", "Using cached NAPALM connection", device)
             return connection
         self.log("info", "Opening new NAPALM connection", device)
-        username, password = self.get_credentials(device)
+        app.connection_pool.make_room()
         optional_args = self.service.optional_args
         if not optional_args:
             optional_args = {}
         if "secret" not in optional_args:
             optional_args["secret"] = device.enable_password
-        driver = get_network_driver(
-            device.napalm_driver if self.use_device_driver else self.driver
-        )
-        napalm_connection = driver(
+        napalm_connection = get_network_driver(driver)(
             hostname=device.ip_address,
             username=username,
             password=password,
@@ -768,13 +1068,12 @@ class Run(AbstractBase):
             optional_args=optional_args,
         )
         napalm_connection.open()
-        app.connections_cache["napalm"][self.parent_runtime][
-            device.name
-        ] = napalm_connection
+        app.connection_pool.add(key, self.parent_runtime, napalm_connection)
         return napalm_connection
 
-    def get_or_close_connection(self, library, device):
-        connection = self.get_connection(library, device)
+    def get_or_close_connection(self, key, device):
+        library = key[0]
+        connection = app.connection_pool.lease(key, self.parent_runtime)
         if not connection:
             return
         if self.start_new_connection:
@@ -791,20 +1090,19 @@ class Run(AbstractBase):
             except Exception:
                 self.disconnect(library, device, connection)
 
-    def get_connection(self, library, device):
-        cache = app.connections_cache[library].get(self.parent_runtime, {})
-        return cache.get(device.name)
-
     def close_device_connection(self, device):
-        for library in ("netmiko", "napalm"):
-            connection = self.get_connection(library, device)
-            if connection:
-                self.disconnect(library, device, connection)
+        for key, connection in app.connection_pool.leased_connections(
+            self.parent_runtime, device.name
+        ):
+            self.disconnect(key[0], device, connection)
+
+    def release_device_connection(self, device):
+        app.connection_pool.release(self.parent_runtime, device.name)
 
     def disconnect(self, library, device, connection):
         try:
+            app.connection_pool.remove(connection)
             connection.disconnect() if library == "netmiko" else connection.close()
-            app.connections_cache[library][self.parent_runtime].pop(device.name)
             self.log("info", f"Closed {library} connection", device)
         except Exception as exc:
             self.log(
@@ -1,11 +1,11 @@
-from re import search
-from sqlalchemy import Boolean, Float, ForeignKey, Integer
+from sqlalchemy import Boolean, Float, ForeignKey, Index, Integer
 from sqlalchemy.ext.associationproxy import association_proxy
-from sqlalchemy.orm import backref, relationship
+from sqlalchemy.orm import backref, deferred, relationship
 
 from eNMS import app
-from eNMS.database.dialect import Column, LargeString, SmallString
-from eNMS.database.functions import fetch, fetch_all
+from eNMS.database import Session
+from eNMS.database.dialect import Column, CompressedJSON, LargeString, SmallString
+from eNMS.database.functions import fetch
 from eNMS.database.associations import (
     pool_device_table,
     pool_link_table,
@@ -35,20 +35,14 @@ class Object(AbstractBase):
     vendor = Column(SmallString)
 
     def update(self, **kwargs):
+        update_pools = not kwargs.get("dont_update_pools", False)
+        if update_pools and self.id:
+            old_values = app.pool_index.object_values(self)
+        else:
+            old_values = None
         super().update(**kwargs)
-        if kwargs.get("dont_update_pools", False):
-            return
-        for pool in fetch_all("pool"):
-            if pool.never_update:
-                continue
-            match = pool.object_match(self)
-            relation, number = f"{self.class_type}s", f"{self.class_type}_number"
-            if match and self not in pool.devices:
-                getattr(pool, relation).append(self)
-                setattr(pool, number, getattr(pool, number) + 1)
-            if self in pool.devices and not match:
-                getattr(pool, relation).remove(self)
-                setattr(pool, number, getattr(pool, number) - 1)
+        if update_pools:
+            app.pool_index.update_object(self, old_values)
 
 
 CustomDevice = type(
@@ -94,8 +88,8 @@ class Device(CustomDevice):
     enable_password = Column(SmallString)
     netmiko_driver = Column(SmallString, default="cisco_ios")
     napalm_driver = Column(SmallString, default="ios")
-    configuration = Column(LargeString)
-    operational_data = Column(LargeString)
+    configuration = deferred(Column(LargeString))
+    operational_data = deferred(Column(LargeString))
     last_failure = Column(SmallString, default="Never")
     last_status = Column(SmallString, default="Never")
     last_update = Column(SmallString, default="Never")
@@ -170,6 +164,40 @@ class Device(CustomDevice):
         return f"{self.name} ({self.model})" if self.model else self.name
 
 
+class ConfigurationBlob(AbstractBase):
+
+    __tablename__ = type = "configuration_blob"
+    private = True
+    id = Column(Integer, primary_key=True)
+    hash = Column(SmallString, unique=True)
+    base_hash = Column(SmallString)
+    depth = Column(Integer, default=0)
+    delta = Column(CompressedJSON)
+
+    def __repr__(self):
+        return self.hash
+
+
+class ConfigurationVersion(AbstractBase):
+
+    __tablename__ = type = "configuration_version"
+    __table_args__ = (
+        Index("ix_configuration_version_device", "device_id", "property", "runtime"),
+        Index("ix_configuration_version_runtime", "runtime"),
+    )
+    private = True
+    id = Column(Integer, primary_key=True)
+    runtime = Column(SmallString)
+    property = Column(SmallString)
+    hash = Column(SmallString)
+    device_id = Column(Integer, ForeignKey("device.id", ondelete="cascade"))
+    device = relationship("Device", foreign_keys="ConfigurationVersion.device_id")
+    device_name = association_proxy("device", "name")
+
+    def __repr__(self):
+        return f"{self.device_name} {self.property} ({self.runtime})"
+
+
 class Link(Object):
 
     __tablename__ = "link"
@@ -359,32 +387,9 @@ class Pool(AbstractPool):
     def object_number(self):
         return f"{self.device_number} devices - {self.link_number} links"
 
-    def property_match(self, obj, property):
-        pool_value = getattr(self, f"{obj.class_type}_{property}")
-        object_value = str(getattr(obj, property))
-        match = getattr(self, f"{obj.class_type}_{property}_match")
-        if not pool_value:
-            return True
-        elif match == "inclusion":
-            return pool_value in object_value
-        elif match == "equality":
-            return pool_value == object_value
-        else:
-            return bool(search(pool_value, object_value))
-
-    def object_match(self, obj):
-        properties = (
-            pool_device_properties
-            if obj.class_type == "device"
-            else pool_link_properties
-        )
-        operator = all if self.operator == "all" else any
-        return operator(self.property_match(obj, property) for property in properties)
-
     def compute_pool(self):
         if self.never_update:
             return
-        self.devices = list(filter(self.object_match, fetch_all("device")))
-        self.device_number = len(self.devices)
-        self.links = list(filter(self.object_match, fetch_all("link")))
-        self.link_number = len(self.links)
+        if not self.id:
+            Session.add(self)
+        app.pool_index.compute_pool(self)
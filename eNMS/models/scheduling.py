@@ -1,7 +1,6 @@
 from apscheduler.triggers.cron import CronTrigger
 from datetime import datetime
-from re import search
-from sqlalchemy import Boolean, case, ForeignKey, Integer
+from sqlalchemy import Boolean, case, ForeignKey, Index, Integer
 from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
@@ -219,6 +218,20 @@ class Changelog(AbstractBase):
         super().update(**kwargs)
 
 
+class Log(AbstractBase):
+
+    __tablename__ = type = "log"
+    __table_args__ = (Index("ix_log_source_time", "source", "time"),)
+    private = True
+    id = Column(Integer, primary_key=True)
+    time = Column(SmallString)
+    source = Column(SmallString)
+    content = Column(LargeString, default="")
+
+    def __repr__(self):
+        return f"{self.time} {self.content}"
+
+
 class Event(AbstractBase):
 
     __tablename__ = type = "event"
@@ -256,17 +269,3 @@ class Event(AbstractBase):
           </li>
         </ul>"""
         ]
-
-    def match_log(self, source, content):
-        source_match = (
-            search(self.log_source, source)
-            if self.log_source_regex
-            else self.log_source in source
-        )
-        content_match = (
-            search(self.log_content, content)
-            if self.log_content_regex
-            else self.log_content in content
-        )
-        if source_match and content_match:
-            self.service.run()
@@ -35,6 +35,20 @@ class NetmikoConfigurationService(ConnectionService):
         netmiko_connection = run.netmiko_connection(device)
         config = run.sub(run.content, locals())
         run.log("info", "Pushing Configuration with Netmiko", device)
+        self.push_configuration(run, device, netmiko_connection, config)
+        return {"success": True, "result": f"configuration OK {config}"}
+
+    async def async_job(self, run, payload, device):
+        netmiko_connection = await run.async_netmiko_connection(device)
+        config = run.sub(run.content, locals())
+        run.log("info", "Pushing Configuration with Netmiko", device)
+        await run.in_executor(
+            self.push_configuration, device, netmiko_connection, config
+        )
+        return {"success": True, "result": f"configuration OK {config}"}
+
+    @staticmethod
+    def push_configuration(run, device, netmiko_connection, config):
         netmiko_connection.send_config_set(
             config.splitlines(),
             delay_factor=run.delay_factor,
@@ -45,7 +59,6 @@ class NetmikoConfigurationService(ConnectionService):
         )
         if run.commit_configuration:
             netmiko_connection.commit()
-        return {"success": True, "result": f"configuration OK {config}"}
 
 
 class NetmikoConfigurationForm(NetmikoForm):
@@ -31,18 +31,35 @@ class NetmikoValidationService(ConnectionService):
 
     def job(self, run, payload, device):
         netmiko_connection = run.netmiko_connection(device)
+        command, parameters = self.command_parameters(run, payload, device)
+        result = netmiko_connection.send_command(command, **parameters)
+        return {"command": command, "result": result}
+
+    async def async_job(self, run, payload, device):
+        netmiko_connection = await run.async_netmiko_connection(device)
+        command, parameters = self.command_parameters(run, payload, device)
+        result = await run.in_executor(
+            self.send_command, device, netmiko_connection, command, parameters
+        )
+        return {"command": command, "result": result}
+
+    @staticmethod
+    def send_command(run, device, netmiko_connection, command, parameters):
+        return netmiko_connection.send_command(command, **parameters)
+
+    def command_parameters(self, run, payload, device):
         command = run.sub(run.command, locals())
         run.log("info", f"Sending '{run.command}' with Netmiko", device)
-        expect_string = run.sub(run.expect_string, locals())
-        result = netmiko_connection.send_command(
+        return (
             command,
-            delay_factor=run.delay_factor,
-            expect_string=run.expect_string or None,
-            auto_find_prompt=run.auto_find_prompt,
-            strip_prompt=run.strip_prompt,
-            strip_command=run.strip_command,
+            {
+                "delay_factor": run.delay_factor,
+                "expect_string": run.expect_string or None,
+                "auto_find_prompt": run.auto_find_prompt,
+                "strip_prompt": run.strip_prompt,
+                "strip_command": run.strip_command,
+            },
         )
-        return {"command": command, "result": result}
 
 
 class NetmikoValidationForm(NetmikoForm):
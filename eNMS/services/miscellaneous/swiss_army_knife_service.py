@@ -2,13 +2,11 @@ from git import Repo
 from git.exc import GitCommandError
 from logging import info
 from pathlib import Path
-from requests import get
 from sqlalchemy import ForeignKey, Integer
 from wtforms import HiddenField
 
 from eNMS import app
 from eNMS.database.dialect import Column
-from eNMS.database.functions import factory, fetch_all
 from eNMS.forms.automation import ServiceForm
 from eNMS.models.automation import Service
 
@@ -31,16 +29,14 @@ class SwissArmyKnifeService(Service):
         return {"success": True}
 
     def cluster_monitoring(self, run, payload):
-        protocol = app.config["cluster"]["scan_protocol"]
-        for instance in fetch_all("instance"):
-            factory(
-                "instance",
-                **get(
-                    f"{protocol}://{instance.ip_address}/rest/is_alive",
-                    timeout=app.config["cluster"]["scan_timeout"],
-                ).json(),
-            )
-        return {"success": True}
+        return {"success": True, "result": app.cluster.monitor()}
+
+    def inventory_sync(self, run, payload):
+        results = {
+            source: app.sync_inventory(source)
+            for source in app.config["inventory_sync"]["sources"]
+        }
+        return {"success": True, "result": results}
 
     def git_push_configurations(self, run, payload, device=None):
         if not app.config["app"]["git_repository"]:
@@ -5,6 +5,7 @@ from re import M, sub
 from sqlalchemy import Boolean, Float, ForeignKey, Integer
 from wtforms import FieldList, FormField, HiddenField, StringField
 
+from eNMS import app
 from eNMS.database.dialect import Column, MutableList, LargeString, SmallString
 from eNMS.forms.automation import NetmikoForm
 from eNMS.models.automation import ConnectionService
@@ -36,25 +37,60 @@ class DataBackupService(ConnectionService):
             device.last_runtime = datetime.now()
             netmiko_connection = run.netmiko_connection(device)
             run.log("info", "Fetching Operational Data", device)
-            for data in ("configuration", "operational_data"):
-                value = run.sub(getattr(self, data), locals())
-                if data == "configuration":
-                    result = netmiko_connection.send_command(value)
-                    for r in self.replacements:
-                        result = sub(r["pattern"], r["replace_with"], result, flags=M)
-                else:
-                    result = f"\n\n".join(
-                        f"{cmd['command']}\n"
-                        + "\n".join(
-                            f"{cmd['prefix']} - {line}" if cmd["prefix"] else line
-                            for line in netmiko_connection.send_command(
-                                cmd["command"]
-                            ).splitlines()
-                        )
-                        for cmd in value
-                    )
-                setattr(device, data, result)
-                with open(path / data, "w") as file:
+            commands = self.get_commands(run, payload, device)
+            data = self.fetch_data(run, device, netmiko_connection, commands)
+        except Exception as e:
+            return self.store_failure(run, path, device, e)
+        return self.store_data(run, path, device, data)
+
+    async def async_job(self, run, payload, device):
+        path = Path.cwd() / "network_data" / device.name
+        path.mkdir(parents=True, exist_ok=True)
+        try:
+            device.last_runtime = datetime.now()
+            netmiko_connection = await run.async_netmiko_connection(device)
+            run.log("info", "Fetching Operational Data", device)
+            commands = self.get_commands(run, payload, device)
+            data = await run.in_executor(
+                self.fetch_data, device, netmiko_connection, commands
+            )
+        except Exception as e:
+            return self.store_failure(run, path, device, e)
+        return self.store_data(run, path, device, data)
+
+    def get_commands(self, run, payload, device):
+        return {
+            "configuration": run.sub(self.configuration, locals()),
+            "operational_data": run.sub(list(self.operational_data), locals()),
+            "replacements": list(self.replacements),
+        }
+
+    @staticmethod
+    def fetch_data(run, device, netmiko_connection, commands):
+        configuration = netmiko_connection.send_command(commands["configuration"])
+        for r in commands["replacements"]:
+            configuration = sub(r["pattern"], r["replace_with"], configuration, flags=M)
+        operational_data = f"\n\n".join(
+            f"{cmd['command']}\n"
+            + "\n".join(
+                f"{cmd['prefix']} - {line}" if cmd["prefix"] else line
+                for line in netmiko_connection.send_command(
+                    cmd["command"]
+                ).splitlines()
+            )
+            for cmd in commands["operational_data"]
+        )
+        return {"configuration": configuration, "operational_data": operational_data}
+
+    def store_data(self, run, path, device, data):
+        try:
+            for property, result in data.items():
+                if not app.configuration_history.store(
+                    device, property, result, device.last_runtime
+                ):
+                    continue
+                setattr(device, property, result)
+                with open(path / property, "w") as file:
                     file.write(result)
             device.last_status = "Success"
             device.last_duration = (
@@ -63,12 +99,15 @@ class DataBackupService(ConnectionService):
             device.last_update = str(device.last_runtime)
             run.generate_yaml_file(path, device)
         except Exception as e:
-            device.last_status = "Failure"
-            device.last_failure = str(device.last_runtime)
-            run.generate_yaml_file(path, device)
-            return {"success": False, "result": str(e)}
+            return self.store_failure(run, path, device, e)
         return {"success": True}
 
+    def store_failure(self, run, path, device, exc):
+        device.last_status = "Failure"
+        device.last_failure = str(device.last_runtime)
+        run.generate_yaml_file(path, device)
+        return {"success": False, "result": str(exc)}
+
 
 class ReplacementForm(FlaskForm):
     pattern = StringField("Pattern")
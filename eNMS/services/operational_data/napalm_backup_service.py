@@ -6,7 +6,6 @@ from wtforms import HiddenField, StringField
 
 from eNMS import app
 from eNMS.database.dialect import Column, MutableDict, SmallString
-from eNMS.database.functions import factory
 from eNMS.forms.automation import NapalmForm
 from eNMS.models.automation import ConnectionService
 
@@ -50,16 +49,11 @@ class NapalmBackupService(ConnectionService):
                     configuration,
                     flags=M,
                 )
-            if device.configuration == configuration:
+            if not app.configuration_history.store(
+                device, "configuration", configuration, device.last_runtime
+            ):
                 return {"success": True, "result": "no change"}
             device.last_update = str(device.last_runtime)
-            factory(
-                "configuration",
-                device=device.id,
-                runtime=device.last_runtime,
-                duration=device.last_duration,
-                configuration=configuration,
-            )
             device.configuration = configuration
             with open(path_device_config / device.name, "w") as file:
                 file.write(configuration)
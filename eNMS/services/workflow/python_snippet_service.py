@@ -22,7 +22,7 @@ class PythonSnippetService(Service):
     def job(self, run, payload, device=None):
 
         try:
-            code_object = compile(run.source_code, "user_python_code", "exec")
+            code_object = run.compile_code(run.source_code, "exec", "user_python_code")
         except Exception as exc:
             run.log("info", f"Compile error: {str(exc)}")
             return {"success": False, "result": {"step": "compile", "error": str(exc)}}
@@ -1,9 +1,11 @@
 from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from sqlalchemy import Boolean, ForeignKey, Integer
 from sqlalchemy.orm import backref, relationship
 from time import sleep
-from wtforms import BooleanField, HiddenField, SelectField
+from wtforms import BooleanField, HiddenField, IntegerField, SelectField
 
+from eNMS import app
 from eNMS.database import Session
 from eNMS.database.base import AbstractBase
 from eNMS.database.dialect import Column, MutableDict, SmallString
@@ -20,6 +22,8 @@ class Workflow(Service):
     parent_type = "service"
     id = Column(Integer, ForeignKey("service.id"), primary_key=True)
     close_connection = Column(Boolean, default=False)
+    parallel_branches = Column(Boolean, default=False)
+    max_parallel_branches = Column(Integer, default=5)
     labels = Column(MutableDict)
     services = relationship(
         "Service", secondary=service_workflow_table, back_populates="workflows"
@@ -98,50 +102,81 @@ class Workflow(Service):
 
     @property
     def start_services(self):
-        return [fetch("service", scoped_name="Start").id]
+        return [self.execution_plan["start"]]
+
+    @property
+    def execution_plan(self):
+        if app.cache_generations.stale(("workflow_plans", str(self.id))):
+            app.workflow_plans.pop(self.id, None)
+        plan = app.workflow_plans.get(self.id)
+        if not plan or plan["last_modified"] != self.last_modified:
+            plan = app.workflow_plans[self.id] = self.compile_execution_plan()
+        return plan
+
+    def compile_execution_plan(self):
+        prerequisites, successors = defaultdict(list), defaultdict(list)
+        for edge in self.edges:
+            if edge.subtype == "prerequisite":
+                prerequisites[edge.destination_id].append(edge.source_id)
+            else:
+                successor = (edge.destination_id, edge.id)
+                successors[(edge.source_id, edge.subtype)].append(successor)
+        plan = {
+            "last_modified": self.last_modified,
+            "prerequisites": dict(prerequisites),
+            "successors": dict(successors),
+        }
+        for service in self.services:
+            if service.scoped_name in ("Start", "End"):
+                plan[service.scoped_name.lower()] = service.id
+        return plan
 
     def job(self, run, *args):
         if run.run_method == "per_service_with_workflow_targets":
             return self.tracking_bfs(run, *args)
+        elif run.parallel_branches:
+            return self.parallel_bfs(run, *args)
         else:
             return self.standard_bfs(run, *args)
 
     def tracking_bfs(self, run, payload):
-        number_of_runs = defaultdict(int)
-        start = fetch("service", scoped_name="Start")
-        end = fetch("service", scoped_name="End")
+        number_of_runs, plan = defaultdict(int), self.execution_plan
+        workflow_services = {service.id: service for service in self.services}
+        start, end = (workflow_services[plan[node]] for node in ("start", "end"))
+        device_ids = {device.name: device.id for device in run.devices}
         track_devices = run.run_method == "per_service_with_workflow_targets"
-        services = [fetch("service", id=id) for id in run.start_services]
+        services = [
+            workflow_services.get(int(id)) or fetch("service", id=id)
+            for id in run.start_services
+        ]
         visited, success, targets = set(), False, defaultdict(set)
         for service in services:
-            targets[service.name] |= {device.name for device in run.devices}
+            targets[service.name] |= set(device_ids)
         while services:
             if run.stop:
                 return {"payload": payload, "success": False}
             service = services.pop()
+            prerequisites = plan["prerequisites"].get(service.id, [])
             if number_of_runs[service.name] >= service.maximum_runs or any(
-                node not in visited
-                for node, _ in service.adjacent_services(self, "source", "prerequisite")
+                node not in visited for node in prerequisites
             ):
                 continue
             number_of_runs[service.name] += 1
-            visited.add(service)
+            visited.add(service.id)
             skip_service = False
             if service.skip_query:
                 skip_service = run.eval(service.skip_query, **locals())
             if skip_service or service.skip or service in (start, end):
                 results = {
                     "success": "skipped",
-                    "summary": {
-                        "success": {device.name for device in run.devices},
-                        "failure": [],
-                    },
+                    "summary": {"success": set(device_ids), "failure": []},
                 }
-                run.run_state["progress"]["service"]["skipped"] += 1
+                run.increment_state(("progress", "service", "skipped"))
             else:
                 kwargs = {
                     "devices": [
-                        fetch("device", name=name).id for name in targets[service.name]
+                        device_ids.get(name) or fetch("device", name=name).id
+                        for name in targets[service.name]
                     ],
                     "service": service.id,
                     "workflow": self.id,
@@ -153,23 +188,23 @@ class Workflow(Service):
                 results = service_run.run(payload)
             if service.run_method in ("once", "per_service_with_service_targets"):
                 edge_type = "success" if results["success"] else "failure"
-                for successor, edge in service.adjacent_services(
-                    self, "destination", edge_type
-                ):
+                successors = plan["successors"].get((service.id, edge_type), [])
+                for successor_id, edge_id in successors:
+                    successor = workflow_services[successor_id]
                     targets[successor.name] |= targets[service.name]
                     services.append(successor)
-                    run.edge_state[edge.id] += len(targets[service.name])
+                    run.increment_edge_state(edge_id, len(targets[service.name]))
             else:
                 summary = results.get("summary")
                 for edge_type in ("success", "failure"):
-                    for successor, edge in service.adjacent_services(
-                        self, "destination", edge_type,
-                    ):
-                        if not summary[edge_type]:
-                            continue
+                    if not summary[edge_type]:
+                        continue
+                    successors = plan["successors"].get((service.id, edge_type), [])
+                    for successor_id, edge_id in successors:
+                        successor = workflow_services[successor_id]
                         targets[successor.name] |= set(summary[edge_type])
                         services.append(successor)
-                        run.edge_state[edge.id] += len(summary[edge_type])
+                        run.increment_edge_state(edge_id, len(summary[edge_type]))
             if not results["success"] == "skipped":
                 sleep(service.waiting_time)
         success_devices = targets[end.name]
@@ -179,41 +214,42 @@ class Workflow(Service):
             "success": list(success_devices),
             "failure": list(failure_devices),
         }
-        run.run_state["progress"]["device"]["success"] = len(success_devices)
-        run.run_state["progress"]["device"]["failure"] = len(failure_devices)
-        run.run_state["summary"] = summary
+        run.set_state(("progress", "device", "success"), len(success_devices))
+        run.set_state(("progress", "device", "failure"), len(failure_devices))
+        run.set_state(("summary",), summary)
         Session.refresh(run)
         return {"payload": payload, "success": success}
 
     def standard_bfs(self, run, payload, device=None):
-        number_of_runs = defaultdict(int)
-        start = fetch("service", scoped_name="Start")
-        end = fetch("service", scoped_name="End")
-        services = [fetch("service", id=id) for id in run.start_services]
+        number_of_runs, plan = defaultdict(int), self.execution_plan
+        workflow_services = {service.id: service for service in self.services}
+        start, end = (workflow_services[plan[node]] for node in ("start", "end"))
+        device_names = {device.name for device in run.devices}
+        services = [
+            workflow_services.get(int(id)) or fetch("service", id=id)
+            for id in run.start_services
+        ]
         visited, success = set(), False
         while services:
             if run.stop:
                 return {"payload": payload, "success": False}
             service = services.pop()
+            prerequisites = plan["prerequisites"].get(service.id, [])
             if number_of_runs[service.name] >= service.maximum_runs or any(
-                node not in visited
-                for node, _ in service.adjacent_services(self, "source", "prerequisite")
+                node not in visited for node in prerequisites
             ):
                 continue
             number_of_runs[service.name] += 1
-            visited.add(service)
+            visited.add(service.id)
             skip_service = False
             if service.skip_query:
                 skip_service = run.eval(service.skip_query, **locals())
             if skip_service or service.skip or service in (start, end):
                 results = {
                     "success": "skipped",
-                    "summary": {
-                        "success": {device.name for device in run.devices},
-                        "failure": [],
-                    },
+                    "summary": {"success": set(device_names), "failure": []},
                 }
-                run.run_state["progress"]["service"]["skipped"] += 1
+                run.increment_state(("progress", "service", "skipped"))
             else:
                 kwargs = {
                     "service": service.id,
@@ -228,16 +264,108 @@ class Workflow(Service):
                 results = service_run.run(payload)
                 if not device:
                     status = "success" if results["success"] else "failure"
-                    run.run_state["progress"]["service"][status] += 1
-            for successor, edge in service.adjacent_services(
-                self, "destination", "success" if results["success"] else "failure",
+                    run.increment_state(("progress", "service", status))
+            edge_type = "success" if results["success"] else "failure"
+            for successor_id, edge_id in plan["successors"].get(
+                (service.id, edge_type), []
             ):
-                services.append(successor)
-                run.edge_state[edge.id] += 1
+                services.append(workflow_services[successor_id])
+                run.increment_edge_state(edge_id)
             if not results["success"] == "skipped":
                 sleep(service.waiting_time)
         Session.refresh(run)
-        return {"payload": payload, "success": end in visited}
+        return {"payload": payload, "success": end.id in visited}
+
+    @staticmethod
+    def run_branch_service(run_id, workflow_id, service_id, payload, device_id=None):
+        try:
+            run = fetch("run", id=run_id)
+            kwargs = {
+                "service": service_id,
+                "workflow": workflow_id,
+                "restart_run": run.restart_run,
+                "parent": run,
+                "parent_runtime": run.parent_runtime,
+            }
+            if device_id:
+                kwargs["devices"] = [device_id]
+            service_run = factory("run", **kwargs)
+            results = service_run.run(payload)
+            if not results["success"] == "skipped":
+                sleep(service_run.service.waiting_time)
+            return results
+        finally:
+            Session.remove()
+
+    def parallel_bfs(self, run, payload, device=None):
+        number_of_runs, plan = defaultdict(int), self.execution_plan
+        workflow_services = {service.id: service for service in self.services}
+        start, end = (workflow_services[plan[node]] for node in ("start", "end"))
+        device_names = {device.name for device in run.devices}
+        services = [
+            workflow_services.get(int(id)) or fetch("service", id=id)
+            for id in run.start_services
+        ]
+        completed, running, deferred = set(), {}, []
+        max_workers = run.max_parallel_branches
+        Session.commit()
+        with ThreadPoolExecutor(max_workers) as executor:
+            while services or running:
+                while services and not run.stop:
+                    service = services.pop()
+                    prerequisites = plan["prerequisites"].get(service.id, [])
+                    if service in running.values() or any(
+                        running_service.id in prerequisites
+                        for running_service in running.values()
+                    ):
+                        deferred.append(service)
+                        continue
+                    if number_of_runs[service.name] >= service.maximum_runs or any(
+                        node not in completed for node in prerequisites
+                    ):
+                        continue
+                    number_of_runs[service.name] += 1
+                    skip_service = False
+                    if service.skip_query:
+                        skip_service = run.eval(service.skip_query, **locals())
+                    if skip_service or service.skip or service in (start, end):
+                        run.increment_state(("progress", "service", "skipped"))
+                        completed.add(service.id)
+                        for successor_id, edge_id in plan["successors"].get(
+                            (service.id, "success"), []
+                        ):
+                            services.append(workflow_services[successor_id])
+                            run.increment_edge_state(edge_id)
+                    else:
+                        future = executor.submit(
+                            self.run_branch_service,
+                            run.id,
+                            self.id,
+                            service.id,
+                            payload,
+                            device.id if device else None,
+                        )
+                        running[future] = service
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    service, results = running.pop(future), future.result()
+                    completed.add(service.id)
+                    if not device:
+                        status = "success" if results["success"] else "failure"
+                        run.increment_state(("progress", "service", status))
+                    edge_type = "success" if results["success"] else "failure"
+                    for successor_id, edge_id in plan["successors"].get(
+                        (service.id, edge_type), []
+                    ):
+                        services.append(workflow_services[successor_id])
+                        run.increment_edge_state(edge_id)
+                services.extend(deferred)
+                deferred.clear()
+        Session.refresh(run)
+        success = not run.stop and end.id in completed
+        return {"payload": payload, "success": success}
 
 
 class WorkflowForm(ServiceForm):
@@ -257,6 +385,10 @@ class WorkflowForm(ServiceForm):
             ),
         ),
     )
+    parallel_branches = BooleanField("Run Independent Branches in Parallel")
+    max_parallel_branches = IntegerField(
+        "Maximum Number of Parallel Branches", default=5
+    )
 
 
 class WorkflowEdge(AbstractBase):
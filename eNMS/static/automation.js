@@ -22,6 +22,7 @@ workflow: true
 */
 
 let currentRuntime;
+let logStreams = {};
 let arrowHistory = [""];
 let arrowPointer = -1;
 
@@ -198,7 +199,7 @@ function displayLogs(service, runtime) {
   $(`#runtimes-${service.id}`).on("change", function() {
     refreshLogs(service, this.value, editor);
   });
-  refreshLogs(service, runtime, editor, true);
+  refreshLogs(service, runtime, editor);
 }
 
 function displayResultsTree(service, runtime) {
@@ -258,17 +259,28 @@ function displayResultsTable(service, runtime) {
 }
 
 // eslint-disable-next-line
-function refreshLogs(service, runtime, editor, first, wasRefreshed) {
+function refreshLogs(service, runtime, editor) {
+  if (logStreams[service.id]) logStreams[service.id].close();
   if (!$(`#runtime-${service.id}`).length) return;
-  call(`/get_service_logs/${service.id}/${runtime}`, function(result) {
-    editor.setValue(result.logs);
+  let wasRunning = false;
+  const source = new EventSource(`/stream_run_state/${service.id}/${runtime}`);
+  logStreams[service.id] = source;
+  source.addEventListener("state", function(event) {
+    JSON.parse(event.data).forEach(([path, value]) => {
+      if (path.join() == "status" && value == "Running") wasRunning = true;
+    });
+  });
+  source.addEventListener("logs", function(event) {
+    if (!$(`#runtime-${service.id}`).length) return source.close();
+    const logs = JSON.parse(event.data).join("\n");
+    editor.replaceRange(editor.getValue() ? `\n${logs}` : logs, {
+      line: editor.lineCount(),
+    });
     editor.setCursor(editor.lineCount(), 0);
-    if (first || result.refresh) {
-      setTimeout(
-        () => refreshLogs(service, runtime, editor, false, result.refresh),
-        1000
-      );
-    } else if (wasRefreshed) {
+  });
+  source.addEventListener("end", function() {
+    source.close();
+    if (wasRunning && $(`#runtime-${service.id}`).length) {
       $(`#runtime-${service.id}`).remove();
       showRuntimePanel("results", service, runtime);
     }
@@ -295,7 +307,7 @@ function runLogic(result) {
   alertify.notify(`Service '${result.service.name}' started.`, "success", 5);
   if (page == "workflow_builder" && workflow) {
     if (result.service.id != workflow.id) {
-      getServiceState(result.service.id, true);
+      getServiceState(result.service.id, result.runtime);
     }
   }
   $(`#${result.service.type}-${result.service.id}`).remove();
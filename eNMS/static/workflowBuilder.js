@@ -79,6 +79,7 @@ let creationMode;
 let mousePosition;
 let currLabel;
 let triggerMenu;
+let stateStream;
 
 function displayWorkflow(workflowData) {
   workflow = workflowData.service;
@@ -727,16 +728,43 @@ function colorService(id, color) {
 }
 
 // eslint-disable-next-line
-function getServiceState(id, first) {
-  call(`/get_service_state/${id}`, function(result) {
-    if (first || result.state.status == "Running") {
-      colorService(id, "#89CFF0");
-      $("#status").text("Status: Running.");
-      setTimeout(() => getServiceState(id), 300);
-    } else {
-      $("#status").text("Status: Idle.");
-      colorService(id, "#D2E5FF");
-    }
+function getServiceState(id, runtime) {
+  colorService(id, "#89CFF0");
+  $("#status").text("Status: Running.");
+  const source = new EventSource(`/stream_run_state/${id}/${runtime}`);
+  source.addEventListener("end", function() {
+    source.close();
+    $("#status").text("Status: Idle.");
+    colorService(id, "#D2E5FF");
+  });
+}
+
+function closeStateStream() {
+  if (!stateStream) return;
+  stateStream.close();
+  stateStream = null;
+}
+
+function streamWorkflowState(runtime) {
+  closeStateStream();
+  let state = {};
+  const workflowId = workflow.id;
+  stateStream = new EventSource(`/stream_run_state/${workflowId}/${runtime}`);
+  stateStream.addEventListener("state", function(event) {
+    if (workflow.id != workflowId) return closeStateStream();
+    JSON.parse(event.data).forEach(([path, value]) => {
+      let node = state;
+      path.slice(0, -1).forEach((key) => {
+        if (!(key in node)) node[key] = {};
+        node = node[key];
+      });
+      node[path[path.length - 1]] = value;
+    });
+    displayWorkflowState({ state: state });
+  });
+  stateStream.addEventListener("end", function() {
+    closeStateStream();
+    if (workflow.id == workflowId) getWorkflowState();
   });
 }
 
@@ -821,7 +849,8 @@ function resetDisplay() {
 function getWorkflowState(periodic) {
   const runtime = $("#current-runtime").val();
   const url = runtime ? `/${runtime}` : "";
-  if (userIsActive && workflow && workflow.id) {
+  if (!periodic) closeStateStream();
+  if (userIsActive && workflow && workflow.id && !stateStream) {
     call(`/get_service_state/${workflow.id}${url}`, function(result) {
       if (result.service.id != workflow.id) return;
       currentRuntime = result.runtime;
@@ -830,6 +859,9 @@ function getWorkflowState(periodic) {
       } else {
         displayWorkflowState(result);
       }
+      if (result.state && result.state.status == "Running") {
+        streamWorkflowState(result.runtime);
+      }
     });
   }
   if (periodic) setTimeout(() => getWorkflowState(true), 4000);
@@ -1,5 +1,11 @@
+from json import load
+
+with open("config.json", "r") as file:
+    run_state = load(file)["run_state"]
+
 bind = "0.0.0.0:5000"
-workers = 1
+workers = run_state["workers"] if run_state["backend"] != "memory" else 1
+threads = 20
 accesslog = "-"
 loglevel = "debug"
 capture_output = True
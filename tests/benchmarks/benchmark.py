@@ -0,0 +1,289 @@
+from argparse import ArgumentParser
+from json import dump, dumps, loads
+from logging import basicConfig, info, INFO
+from pathlib import Path
+from resource import getrusage, RUSAGE_CHILDREN, RUSAGE_SELF
+from subprocess import PIPE, run
+from sys import executable, exit, stdout
+from time import perf_counter, sleep
+
+baselines_path = Path(__file__).parent / "baselines.json"
+module = "tests.benchmarks.benchmark"
+device_numbers = (10, 100, 1000, 5000)
+scenarios = (
+    "per_device",
+    "multiprocessing",
+    "process",
+    "asyncio",
+    "standard_bfs",
+    "tracking_bfs",
+)
+latency = 0
+
+
+def simulate_io():
+    if latency:
+        sleep(latency)
+
+
+class MockNetmikoConnection:
+    def __init__(self, **kwargs):
+        simulate_io()
+        self.kwargs = kwargs
+        self.mode = False
+
+    def send_command(self, command, **kwargs):
+        simulate_io()
+        return f"{self.kwargs['ip']}#{command}\nmock output"
+
+    def find_prompt(self):
+        simulate_io()
+        return f"{self.kwargs['ip']}#"
+
+    def enable(self):
+        simulate_io()
+
+    def check_config_mode(self):
+        return self.mode
+
+    def config_mode(self):
+        simulate_io()
+        self.mode = True
+
+    def exit_config_mode(self):
+        simulate_io()
+        self.mode = False
+
+    def disconnect(self):
+        simulate_io()
+
+
+class MockNapalmDriver:
+    def __init__(self, hostname, **kwargs):
+        self.hostname = hostname
+
+    def open(self):
+        simulate_io()
+
+    def close(self):
+        simulate_io()
+
+    def is_alive(self):
+        return {"is_alive": True}
+
+    def get_facts(self):
+        simulate_io()
+        return {"hostname": self.hostname, "vendor": "mock", "uptime": 0}
+
+
+def install_mock_devices():
+    from eNMS.models import execution
+
+    execution.ConnectHandler = MockNetmikoConnection
+    execution.get_network_driver = lambda driver: MockNapalmDriver
+
+
+class Counters:
+    def __init__(self):
+        from sqlalchemy import event
+        from eNMS.database import engine, Session
+
+        self.commits = self.queries = 0
+        event.listen(engine, "before_cursor_execute", self.count_query)
+        event.listen(Session, "after_commit", self.count_commit)
+
+    def count_query(self, *args):
+        self.queries += 1
+
+    def count_commit(self, session):
+        self.commits += 1
+
+
+def create_devices(number):
+    from eNMS.database import Session
+    from eNMS.database.functions import factory, fetch_all
+
+    existing, names = {device.name for device in fetch_all("device")}, set()
+    for index in range(number):
+        name = f"benchmark_{index}"
+        names.add(name)
+        if name not in existing:
+            factory(
+                "device",
+                name=name,
+                ip_address=f"10.{index // 65536}.{index // 256 % 256}.{index % 256}",
+                netmiko_driver="cisco_ios",
+                napalm_driver="ios",
+            )
+        if index % 500 == 499:
+            Session.commit()
+    Session.commit()
+    return [device.id for device in fetch_all("device") if device.name in names]
+
+
+def delete_benchmark_services():
+    from eNMS.database import Session
+    from eNMS.database.functions import delete, fetch_all
+
+    for service in fetch_all("service"):
+        if service.scoped_name.startswith("benchmark_"):
+            delete("service", id=service.id)
+    Session.commit()
+
+
+def create_service(service_type, name, **kwargs):
+    from eNMS.database import Session
+    from eNMS.database.functions import factory
+
+    service = factory(service_type, scoped_name=f"benchmark_{name}", **kwargs)
+    Session.commit()
+    return service
+
+
+def create_workflow(devices, run_method):
+    from eNMS.database import Session
+    from eNMS.database.functions import factory, fetch
+
+    workflow = create_service(
+        "workflow", run_method, devices=devices, run_method=run_method
+    )
+    service_kwargs = {"workflows": [workflow.id], "credentials": "device"}
+    if run_method == "per_service_with_service_targets":
+        service_kwargs["devices"] = devices
+    services = [
+        fetch("service", scoped_name="Start"),
+        create_service(
+            "netmiko_validation_service",
+            f"{run_method}_netmiko",
+            command="show version",
+            **service_kwargs,
+        ),
+        create_service(
+            "napalm_getters_service",
+            f"{run_method}_napalm",
+            getters=["get_facts"],
+            **service_kwargs,
+        ),
+        fetch("service", scoped_name="End"),
+    ]
+    for source, destination in zip(services, services[1:]):
+        factory(
+            "workflow_edge",
+            name=f"benchmark:{source.id}->{destination.id}",
+            workflow=workflow.id,
+            subtype="success",
+            source=source.id,
+            destination=destination.id,
+        )
+    Session.commit()
+    return workflow
+
+
+def create_scenario(scenario, devices):
+    kwargs = {"devices": devices, "credentials": "device", "command": "show version"}
+    if scenario == "per_device":
+        return create_service("netmiko_validation_service", scenario, **kwargs)
+    elif scenario in ("multiprocessing", "process", "asyncio"):
+        mode = "thread" if scenario == "multiprocessing" else scenario
+        return create_service(
+            "netmiko_validation_service",
+            scenario,
+            multiprocessing=True,
+            multiprocessing_mode=mode,
+            max_processes=15,
+            **kwargs,
+        )
+    elif scenario == "standard_bfs":
+        return create_workflow(devices, "per_service_with_service_targets")
+    else:
+        return create_workflow(devices, "per_service_with_workflow_targets")
+
+
+def run_scenario(scenario, number, io_latency):
+    global latency
+    from eNMS import app
+
+    latency = io_latency
+    install_mock_devices()
+    delete_benchmark_services()
+    service = create_scenario(scenario, create_devices(number))
+    counters, start = Counters(), perf_counter()
+    results = app.run(service.id, creator="admin")
+    wall_time = perf_counter() - start
+    peak_rss = max(
+        getrusage(RUSAGE_SELF).ru_maxrss, getrusage(RUSAGE_CHILDREN).ru_maxrss
+    )
+    return {
+        "success": results["success"],
+        "latency": io_latency,
+        "wall_time": round(wall_time, 3),
+        "commits": counters.commits,
+        "queries": counters.queries,
+        "queries_per_device": round(counters.queries / number, 2),
+        "peak_rss_mb": round(peak_rss / 1024, 1),
+    }
+
+
+def compare(name, metrics, baseline, tolerance):
+    regressions = []
+    for metric in ("wall_time", "commits", "queries_per_device", "peak_rss_mb"):
+        if baseline.get(metric) and metrics[metric] > baseline[metric] * tolerance:
+            regressions.append(
+                f"{name}: {metric} {metrics[metric]} (baseline {baseline[metric]})"
+            )
+    return regressions
+
+
+def main():
+    parser = ArgumentParser(description="Service execution benchmarks")
+    parser.add_argument("--scenarios", nargs="+", default=scenarios, choices=scenarios)
+    parser.add_argument("--devices", nargs="+", type=int, default=device_numbers)
+    parser.add_argument("--save", action="store_true", help="Store the baselines")
+    parser.add_argument("--tolerance", type=float, default=1.25)
+    parser.add_argument("--latency", type=float, default=0.01, help="Seconds per call")
+    parser.add_argument("--run", nargs=2, help="Run a single scenario in process")
+    args = parser.parse_args()
+    if args.run:
+        measures = run_scenario(args.run[0], int(args.run[1]), args.latency)
+        return stdout.write(f"{dumps(measures)}\n")
+    basicConfig(format="%(message)s", level=INFO)
+    baselines = loads(baselines_path.read_text()) if baselines_path.exists() else {}
+    measures, regressions = {}, []
+    for scenario in args.scenarios:
+        for number in args.devices:
+            name = f"{scenario}_{number}"
+            process = run(
+                [
+                    executable,
+                    "-m",
+                    module,
+                    "--run",
+                    scenario,
+                    str(number),
+                    "--latency",
+                    str(args.latency),
+                ],
+                stdout=PIPE,
+                stderr=PIPE,
+                universal_newlines=True,
+            )
+            if process.returncode:
+                exit(f"{name} failed:\n{process.stderr}")
+            measures[name] = loads(process.stdout.splitlines()[-1])
+            info(f"{name} {measures[name]}")
+            if baselines.get(name, {}).get("latency", 0) != args.latency:
+                info(f"{name}: no baseline with a latency of {args.latency}s")
+            elif name in baselines:
+                regressions.extend(
+                    compare(name, measures[name], baselines[name], args.tolerance)
+                )
+    if args.save:
+        with open(baselines_path, "w") as file:
+            dump({**baselines, **measures}, file, indent=2, sort_keys=True)
+    for regression in regressions:
+        info(f"REGRESSION - {regression}")
+    exit(bool(regressions))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,14 @@
+from collections import Counter
+from pickle import dumps
+from sqlalchemy import LargeBinary, select, type_coerce
+
 from eNMS import app
-from eNMS.database.functions import fetch, fetch_all
+from eNMS.controller.cluster import Cluster
+from eNMS.controller.states import CacheGenerations, RunStore
+from eNMS.controller.vault import SecretCache
+from eNMS.database import Session
+from eNMS.database.functions import factory, fetch, fetch_all
+from eNMS.models import models
 
 from tests.conftest import check_pages
 
@@ -36,3 +45,87 @@ def test_user_management(user_client):
     user1 = fetch("user", name="user1")
     user_client.post("/delete_instance/user/{}".format(user1.id))
     assert len(fetch_all("user")) == 3
+
+
+def test_convert_pickled_payloads(user_client):
+    service = fetch("service", scoped_name="Start")
+    run = factory("run", service=service.id, properties={"devices": [1]})
+    Session.commit()
+    table = models["run"].__table__
+    state = {"status": "Completed", "summary": {"success": ["Washington"]}}
+    Session.execute(
+        table.update()
+        .where(table.c.id == run.id)
+        .values(state=type_coerce(dumps(state), LargeBinary))
+    )
+    Session.commit()
+    Session.expire_all()
+    assert fetch("run", id=run.id).state == state
+    assert app.convert_pickled_payloads(batch_size=2) >= 1
+    Session.expire_all()
+    raw_state = Session.execute(
+        select([type_coerce(table.c.state, LargeBinary)]).where(table.c.id == run.id)
+    ).scalar()
+    assert raw_state[:1] != b"\x80" and fetch("run", id=run.id).state == state
+
+
+class VaultStore(dict):
+    def __init__(self):
+        self.reads = Counter()
+
+    def read(self, path):
+        self.reads[path] += 1
+        return self.get(path)
+
+    def write(self, path, data):
+        self[path] = {"data": {"data": data}}
+
+
+def test_vault_secret_cache():
+    store, run_store = VaultStore(), RunStore()
+    cache = SecretCache(store, 300, 4, CacheGenerations(run_store))
+    store.write(cache.path("device", "router1", "password"), {"password": "secret"})
+    cache.prefetch("device", [f"router{index}" for index in range(1, 51)] * 2)
+    assert len(store.reads) == 100 and set(store.reads.values()) == {1}
+    assert cache.read("device", "router1", "password") == "secret"
+    assert cache.read("device", "router2", "enable_password") == ""
+    assert sum(store.reads.values()) == 100
+    assert b"secret" not in cache.secrets[("device", "router1", "password")][1]
+    cache.write("device", "router2", "password", "new")
+    assert cache.read("device", "router2", "password") == "new"
+    cache.invalidate("device", "router1")
+    assert cache.read("device", "router1", "password") == "secret"
+    assert store.reads[cache.path("device", "router1", "password")] == 2
+    other_worker = SecretCache(store, 300, 4, CacheGenerations(run_store))
+    assert other_worker.read("device", "router1", "password") == "secret"
+    cache.write("device", "router1", "password", "changed")
+    assert other_worker.read("device", "router1", "password") == "changed"
+    cache.ttl = -1
+    cache.set(("device", "router3", "password"), "expired")
+    assert cache.read("device", "router3", "password") == ""
+
+
+class ClusterNetwork(Cluster):
+    live_servers = {"10.0.0.3": 20.0, "10.0.1.200": 40.0}
+
+    def heartbeat(self, address, timeout=None):
+        self.polled.append(address)
+        if address not in self.live_servers:
+            return None
+        return {"name": f"server-{address}", "cpu_load": self.live_servers[address]}
+
+
+def test_cluster_scan(user_client):
+    cluster = ClusterNetwork(
+        app.request_session,
+        **{**app.config["cluster"], "scan_subnet": "10.0.0.0/23", "scan_workers": 8},
+    )
+    cluster.polled = []
+    assert cluster.scan() == 2 and len(set(cluster.polled)) == 512
+    servers = {server.ip_address: server for server in fetch_all("server")}
+    assert servers["10.0.1.200"].cpu_load == 40.0
+    assert servers["10.0.0.3"].status == "up"
+    cluster.live_servers = {"10.0.0.3": 10.0}
+    assert cluster.monitor() == {"10.0.0.3": 10.0}
+    assert fetch("server", ip_address="10.0.1.200").status == "down"
+    assert [server[0] for server in cluster.servers()] == [None, "10.0.0.3"]
@@ -0,0 +1,511 @@
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.schedulers.background import BackgroundScheduler
+from base64 import b64encode
+from gzip import decompress
+from json import loads
+from multiprocessing import get_context
+from time import sleep
+from requests import Session as RequestSession
+from requests.exceptions import ReadTimeout
+from sqlalchemy import event
+from threading import BoundedSemaphore, Event, Thread, current_thread
+from urllib.parse import quote
+
+from eNMS import app
+from eNMS.controller.cluster import Cluster
+from eNMS.controller.connections import ConnectionPool
+from eNMS.controller.logs import RunLogs, SharedRunLogs
+from eNMS.controller.states import CacheGenerations, SQLiteRunStore
+from eNMS.database import Session
+from eNMS.database.functions import factory, fetch, fetch_all
+from eNMS.models import execution
+
+from tests.benchmarks.benchmark import MockNetmikoConnection
+from tests.test_inventory import create_from_file
+
+
+snippet = """results["success"] = True
+results["result"] = device.name"""
+
+
+def create_snippet_service(name, **kwargs):
+    service = factory(
+        "python_snippet_service",
+        **{"scoped_name": name, "source_code": snippet, **kwargs},
+    )
+    Session.commit()
+    return service
+
+
+def test_process_pool_run(user_client):
+    create_from_file(user_client, "europe.xls")
+    devices = [device.id for device in fetch_all("device")[:6]]
+    service = create_snippet_service(
+        "process_pool_test",
+        devices=devices,
+        multiprocessing=True,
+        multiprocessing_mode="process",
+        max_processes=3,
+    )
+    results = app.run(service.id, creator="admin")
+    assert results["success"]
+    assert len(results["summary"]["success"]) == 6
+    run = fetch("run", runtime=results["runtime"])
+    assert len(run.results) == 7
+    assert sum("FINISHED" in log for log in results["logs"]) == 6
+
+
+def acquire_locks():
+    with app.run_store.lock, app.run_stream.condition, app.connection_pool.lock:
+        with app.result_writer.lock, app.result_writer.write_lock:
+            return True
+
+
+def test_process_pool_fork_with_held_locks():
+    locks_held, release_locks = Event(), Event()
+
+    def hold_locks():
+        with app.run_store.lock, app.run_stream.condition, app.connection_pool.lock:
+            with app.result_writer.lock, app.result_writer.write_lock:
+                locks_held.set()
+                release_locks.wait()
+
+    thread = Thread(target=hold_locks)
+    thread.start()
+    locks_held.wait()
+    try:
+        with get_context("fork").Pool(1, execution.Run.init_process) as pool:
+            assert pool.apply_async(acquire_locks).get(timeout=10)
+    finally:
+        release_locks.set()
+        thread.join()
+
+
+def test_asyncio_run(user_client):
+    create_from_file(user_client, "europe.xls")
+    devices = [device.id for device in fetch_all("device")[:6]]
+    service = factory(
+        "netmiko_validation_service",
+        scoped_name="asyncio_test",
+        devices=devices,
+        credentials="device",
+        command="show version",
+        multiprocessing=True,
+        multiprocessing_mode="asyncio",
+        max_processes=3,
+    )
+    Session.commit()
+    connect_handler, execution.ConnectHandler = (
+        execution.ConnectHandler,
+        MockNetmikoConnection,
+    )
+    commits = []
+
+    def record_commit(session):
+        commits.append(current_thread().name)
+
+    event.listen(Session, "after_commit", record_commit)
+    try:
+        results = app.run(service.id, creator="admin")
+    finally:
+        execution.ConnectHandler = connect_handler
+        event.remove(Session, "after_commit", record_commit)
+    assert results["success"] and len(results["summary"]["success"]) == 6
+    assert not any(name.startswith("ThreadPoolExecutor") for name in commits)
+    run = fetch("run", runtime=results["runtime"])
+    outputs = [result.result["result"] for result in run.results if result.device_id]
+    assert sorted(outputs) == sorted(
+        f"{device.ip_address}#show version\nmock output" for device in run.devices
+    )
+    assert sum("Opening new Netmiko connection" in log for log in results["logs"]) == 6
+
+
+def test_batched_results(user_client):
+    create_from_file(user_client, "europe.xls")
+    devices = [device.id for device in fetch_all("device")[:8]]
+    service = create_snippet_service(
+        "batched_results_test",
+        devices=devices,
+        multiprocessing=True,
+        max_processes=4,
+    )
+    app.result_writer.batch_size = 3
+    results = app.run(service.id, creator="admin")
+    app.result_writer.batch_size = app.config["results"]["batch_size"]
+    assert results["success"]
+    run = fetch("run", runtime=results["runtime"])
+    assert len(run.results) == 9
+    devices = {result.device_name for result in run.results}
+    assert devices == {None, *results["summary"]["success"]}
+
+
+def test_notification_device_results(user_client):
+    create_from_file(user_client, "europe.xls")
+    devices = [device.id for device in fetch_all("device")[:3]]
+    service = create_snippet_service(
+        "notification_test",
+        devices=devices,
+        send_notification=True,
+        send_notification_method="mail",
+        include_device_results=True,
+    )
+    mails = []
+    app.send_email = lambda *args, **kwargs: mails.append(kwargs)
+    try:
+        results = app.run(service.id, creator="admin")
+    finally:
+        del app.send_email
+    assert results["notification"]["success"]
+    device_results = mails[0]["file_content"].split("Device Results:")[1]
+    for name in results["summary"]["success"]:
+        assert f"\t{name}: " in device_results
+
+
+def test_distributed_run(user_client):
+    servers = [(None, 1, 0), ("server1", 2, 50), ("server2", 1, 100)]
+    shards = Cluster.shard(list(range(10)), servers)
+    assert [(address, len(devices)) for address, devices in shards] == [
+        (None, 5),
+        ("server1", 5),
+    ]
+    assert sum((devices for _, devices in shards), []) == list(range(10))
+    create_from_file(user_client, "europe.xls")
+    devices = [device.id for device in fetch_all("device")[:6]]
+    service = create_snippet_service("distributed_test", devices=devices)
+    service.distributed = app.cluster.active = True
+    Session.commit()
+    credentials = b64encode(b"admin:admin").decode("utf-8")
+
+    def run_shard(address, auth, run_id, devices, payload):
+        response = user_client.post(
+            "/rest/run_shard",
+            json={"run_id": run_id, "devices": devices, "payload": payload},
+            headers={"Authorization": f"Basic {credentials}"},
+        )
+        return None if response.status_code == 503 else response.json
+
+    def timed_out_shard(*args):
+        raise ReadTimeout("read timeout")
+
+    def distributed_run(shard_function):
+        app.cluster.run_shard = shard_function
+        return app.run(service.id, creator="admin")
+
+    cluster_servers, cluster_run_shard = app.cluster.servers, app.cluster.run_shard
+    app.cluster.servers = lambda: [(None, 1, 0), ("server1", 1, 0)]
+    try:
+        results = distributed_run(run_shard)
+        unreachable_results = distributed_run(lambda *args: None)
+        timeout_results = distributed_run(timed_out_shard)
+    finally:
+        app.cluster.servers, app.cluster.run_shard = cluster_servers, cluster_run_shard
+        app.cluster.active = app.config["cluster"]["active"]
+    assert results["success"] and len(results["summary"]["success"]) == 6
+    assert len(fetch("run", runtime=results["runtime"]).results) == 7
+    assert sum("STARTING" in log for log in results["logs"]) == 6
+    assert len(unreachable_results["summary"]["success"]) == 6
+    assert sum("STARTING" in log for log in unreachable_results["logs"]) == 6
+    assert not timeout_results["success"]
+    assert len(timeout_results["summary"]["failure"]) == 3
+    assert sum("STARTING" in log for log in timeout_results["logs"]) == 3
+    assert run_shard(None, None, 0, devices, {}) is None
+    cluster = Cluster(RequestSession(), **app.config["cluster"])
+    assert cluster.run_shard("127.0.0.1:1", None, 0, devices, {}) is None
+
+
+def parse_events(text):
+    return [
+        dict(line.split(": ", 1) for line in message.split("\n"))
+        for message in text.strip().split("\n\n")
+    ]
+
+
+def test_run_state_stream(user_client):
+    create_from_file(user_client, "europe.xls")
+    devices = [device.id for device in fetch_all("device")[:3]]
+    service = create_snippet_service("stream_test", devices=devices)
+    results = app.run(service.id, creator="admin")
+    response = user_client.get(f"/stream_run_state/{service.id}/latest")
+    assert response.mimetype == "text/event-stream"
+    messages = parse_events(response.get_data(as_text=True))
+    events = {message["event"]: loads(message["data"]) for message in messages}
+    assert events["runtime"] == events["end"] == results["runtime"]
+    assert events["logs"] == results["logs"]
+    assert messages[-2]["id"] == str(len(results["logs"]))
+    assert [["status"], "Completed"] in events["state"]
+    sent_state, state = {}, {"progress": {"device": {"success": 1, "failure": 0}}}
+    assert len(app.run_stream.delta(sent_state, state)) == 2
+    state["progress"]["device"]["success"] = 2
+    delta = app.run_stream.delta(sent_state, state)
+    assert delta == [[("progress", "device", "success"), 2]]
+
+
+def test_run_state_stream_limits(user_client):
+    service = create_snippet_service("stream_limits_test")
+    runtime, stream = app.get_time(), app.run_stream
+    app.run_store.create(runtime, {"status": "Running"})
+    app.run_logs[runtime].extend(["line 1", "line 2", "line 3"])
+    settings = (stream.streams, stream.interval, stream.heartbeat, stream.max_idle)
+    stream.streams, stream.interval, stream.heartbeat = BoundedSemaphore(0), 0, 0.1
+    try:
+        response = user_client.get(
+            f"/stream_run_state/{service.id}/{runtime}", headers={"Last-Event-ID": "1"}
+        )
+        messages = parse_events(response.get_data(as_text=True))
+        assert messages[2] == {
+            "event": "logs",
+            "id": "3",
+            "data": '["line 2", "line 3"]',
+        }
+        assert messages[-1] == {"retry": "3000"}
+        stream.streams, stream.max_idle = BoundedSemaphore(1), 0.3
+        messages = parse_events("".join(app.stream_run_state(service.id, runtime)))
+        assert {"": "heartbeat"} in messages and messages[-1]["event"] == "end"
+        events = app.stream_run_state(service.id, runtime)
+        assert next(events).startswith("event: runtime")
+        assert next(events).startswith("event: state")
+        assert not stream.streams.acquire(blocking=False)
+        app.run_store.pop(runtime)
+        assert list(events)[-1].startswith("event: end")
+        assert stream.streams.acquire(blocking=False)
+    finally:
+        stream.streams, stream.interval, stream.heartbeat, stream.max_idle = settings
+        app.run_logs.pop(runtime)
+
+
+def test_run_logs(user_client):
+    run_logs, lines = RunLogs(app.path / "logs" / "runs", 4), []
+    for index in range(10):
+        lines.append(f"line {index}\nwith a new line")
+        run_logs["runtime"].append(lines[-1])
+    run_log = run_logs["runtime"]
+    assert len(run_log) == 10 and len(run_log.lines) <= 4
+    for offset in (0, 3, 8, 10):
+        assert run_logs.read("runtime", offset) == lines[offset:]
+    assert run_logs.pop("runtime") == lines and not run_log.path.exists()
+    create_from_file(user_client, "europe.xls")
+    devices = [device.id for device in fetch_all("device")[:3]]
+    service = create_snippet_service("logs_test", devices=devices)
+    results = app.run(service.id, creator="admin")
+    app.config["app"]["compression_threshold"] = 0
+    response = user_client.post(
+        f"/get_service_logs/{service.id}/{quote(results['runtime'])}/2",
+        headers={"Accept-Encoding": "gzip"},
+    )
+    app.config["app"]["compression_threshold"] = 1024
+    assert response.headers["Content-Encoding"] == "gzip"
+    logs = loads(decompress(response.data))
+    assert logs["logs"] == "\n".join(results["logs"][2:])
+    assert logs["offset"] == len(results["logs"]) and not logs["refresh"]
+    service = create_snippet_service(
+        "logs_once_test",
+        devices=devices,
+        run_method="once",
+        source_code='results["success"] = True',
+    )
+    runtime = app.get_time()
+    app.run(service.id, creator="admin", runtime=runtime)
+    logs = app.get_service_logs(service.id, runtime)
+    assert "FINISHED" in logs["logs"] and not logs["refresh"]
+    assert app.get_service_logs(service.id + 1, runtime)["refresh"]
+    events = list(app.stream_run_state(service.id, runtime))
+    assert events[-1].startswith("event: end")
+
+
+def increment_run_state(store):
+    for _ in range(50):
+        store.increment("runtime", ("edges", "1"))
+        store.append("runtime", ("summary", "success"), "device")
+
+
+def test_shared_run_state(tmp_path):
+    store = SQLiteRunStore(tmp_path / "run_state.db")
+    state = {"status": "Idle", "progress": {"device": {"total": 0}}, "edges": {}}
+    assert store.create("runtime", state) and not store.create("runtime", {})
+    store.setdefault("runtime", ("services", "2"), {"status": "Running"})
+    store.setdefault("runtime", ("services", "2"), {"status": "Idle"})
+    processes = [
+        get_context("fork").Process(target=increment_run_state, args=(store,))
+        for _ in range(4)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert store.value("runtime", ("edges",)) == {"1": 200}
+    assert len(store.value("runtime", ("summary", "success"))) == 200
+    store.append("other", ("summary", "success"), "device")
+    store.set("other", ("summary",), {"success": ["reset"]})
+    store.append("other", ("summary", "success"), "device")
+    assert store.pop("other") == {"summary": {"success": ["reset", "device"]}}
+    assert store.value("runtime", ("services", "2", "status")) == "Running"
+    store.set("runtime", ("status",), "stop")
+    run_logs = SharedRunLogs(store)
+    run_logs["runtime"].extend(["line 1", "line 2"])
+    assert run_logs.read("runtime", 1) == ["line 2"]
+    assert run_logs.pop("runtime") == ["line 1", "line 2"]
+    worker, other_worker = CacheGenerations(store), CacheGenerations(store)
+    assert not other_worker.stale(("table", "device"))
+    worker.invalidate(("table", "device"))
+    assert other_worker.stale(("table", "device"))
+    assert not other_worker.stale(("table", "device"))
+    state = store.pop("runtime")
+    assert state["status"] == "stop" and len(state["summary"]["success"]) == 200
+    assert state["progress"] == {"device": {"total": 0}} and not store.get("runtime")
+
+
+def test_run_scheduled_by_paused_worker(user_client):
+    service, jobstore = create_snippet_service("paused_worker_test"), MemoryJobStore()
+    worker, leader = [
+        BackgroundScheduler(
+            jobstores={"default": jobstore}, job_defaults={"misfire_grace_time": 1}
+        )
+        for _ in range(2)
+    ]
+    worker.start(paused=True)
+    scheduler, app.scheduler = app.scheduler, worker
+    try:
+        app.schedule_run(service.id, creator="admin")
+    finally:
+        app.scheduler = scheduler
+    sleep(2)
+    leader.start()
+    for _ in range(50):
+        if fetch("run", allow_none=True, service_id=service.id):
+            break
+        sleep(0.1)
+    leader.shutdown()
+    worker.shutdown()
+    assert fetch("run", service_id=service.id).status == "Completed"
+
+
+def test_result_retention(user_client):
+    create_from_file(user_client, "europe.xls")
+    devices = [device.id for device in fetch_all("device")[:2]]
+    service = create_snippet_service("retention_test", devices=devices)
+    runtimes = [app.run(service.id, creator="admin")["runtime"] for _ in range(4)]
+    service.retention_runs = 2
+    Session.commit()
+    app.result_retention.apply()
+    service = fetch("service", name="retention_test")
+    runs = fetch("run", all_matches=True, service_id=service.id)
+    assert sorted(run.runtime for run in runs) == runtimes[2:]
+    results = fetch("result", all_matches=True, service_id=service.id)
+    assert {result.parent_runtime for result in results} == set(runtimes[2:])
+    summaries = fetch("result_summary", all_matches=True, service_id=service.id)
+    assert len(summaries) == 3
+    assert all(summary.day == runtimes[0][:10] for summary in summaries)
+    assert all(summary.success_count == 2 for summary in summaries)
+    app.clear_results(service.id)
+    assert not fetch("run", allow_none=True, service_id=service.id)
+    assert not fetch("result", allow_none=True, service_id=service.id)
+
+
+def test_substitution(user_client):
+    create_from_file(user_client, "europe.xls")
+    device = fetch_all("device")[0]
+    run = factory("run", service=create_snippet_service("substitution_test").id)
+    template = {"{{ device.name }}": ["{{device.ip_address}}:{{ 20 + 2 }}", 1]}
+    for _ in range(2):
+        substitution = run.sub(template, {"device": device})
+        assert substitution == {device.name: [f"{device.ip_address}:22", 1]}
+    assert run.compile_template.cache_info().hits >= 2
+    assert run.sub("no placeholder", {}) == "no placeholder"
+    assert run.eval(" device.name", device=device) == device.name
+
+
+def create_workflow(name, edges, **kwargs):
+    workflow = factory("workflow", scoped_name=name, **kwargs)
+    Session.commit()
+    services = {
+        "Start": fetch("service", scoped_name="Start"),
+        "End": fetch("service", scoped_name="End"),
+    }
+    for source, destination, subtype in edges:
+        for service in (source, destination):
+            if service not in services:
+                services[service] = create_snippet_service(
+                    f"{name}_{service}", workflows=[workflow.id]
+                )
+        factory(
+            "workflow_edge",
+            name=f"{name}:{source}->{destination}",
+            workflow=workflow.id,
+            subtype=subtype,
+            source=services[source].id,
+            destination=services[destination].id,
+        )
+    Session.commit()
+    return workflow
+
+
+def test_workflow_run(user_client):
+    create_from_file(user_client, "europe.xls")
+    devices = [device.id for device in fetch_all("device")[:4]]
+    edges = (
+        ("Start", "A", "success"),
+        ("A", "B", "success"),
+        ("B", "End", "success"),
+        ("A", "C", "prerequisite"),
+        ("C", "End", "failure"),
+    )
+    for run_method in ("per_device", "per_service_with_workflow_targets"):
+        workflow = create_workflow(
+            f"workflow_{run_method}", edges, devices=devices, run_method=run_method
+        )
+        results = app.run(workflow.id, creator="admin")
+        assert results["success"]
+        assert sorted(results["state"]["edges"].values()) == [4, 4, 4]
+
+
+def test_parallel_workflow_run(user_client):
+    create_from_file(user_client, "europe.xls")
+    devices = [device.id for device in fetch_all("device")[:4]]
+    edges = (
+        ("Start", "A", "success"),
+        ("Start", "B", "success"),
+        ("A", "C", "success"),
+        ("B", "C", "success"),
+        ("A", "C", "prerequisite"),
+        ("B", "C", "prerequisite"),
+        ("C", "End", "success"),
+    )
+    for run_method in ("per_device", "per_service_with_service_targets"):
+        workflow = create_workflow(
+            f"parallel_workflow_{run_method}",
+            edges,
+            devices=devices,
+            run_method=run_method,
+            parallel_branches=True,
+            max_parallel_branches=2,
+        )
+        results = app.run(workflow.id, creator="admin")
+        assert results["success"]
+        number_of_runs = 4 if run_method == "per_device" else 1
+        assert set(results["state"]["edges"].values()) == {number_of_runs}
+
+
+class FakeConnection:
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_connection_pool(user_client):
+    pool = ConnectionPool(True, 600, 2, 60)
+    key, connection = ("napalm", "router", "10.0.0.1", 22, "ios", "admin", 0), None
+    for runtime in ("run1", "run2"):
+        connection = pool.lease(key, runtime)
+        if not connection:
+            connection = FakeConnection()
+            pool.add(key, runtime, connection)
+        pool.release(runtime)
+    assert pool.metrics["open"] == pool.metrics["hit"] == 1
+    pool.add(key, "run3", FakeConnection())
+    pool.make_room()
+    assert connection.closed and pool.number_of_connections == 1
+    pool.idle_timeout = -1
+    pool.release("run3")
+    pool.evict_idle_connections()
+    assert not pool.number_of_connections
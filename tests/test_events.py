@@ -1,8 +1,12 @@
+from socket import AF_INET, SOCK_DGRAM, socket
+from time import sleep
 from werkzeug.datastructures import ImmutableMultiDict
 
 from eNMS import app
+from eNMS.controller.results import BatchWriter
+from eNMS.controller.syslog import SyslogServer
 from eNMS.database import Session
-from eNMS.database.functions import fetch_all
+from eNMS.database.functions import factory, fetch, fetch_all
 
 from tests.conftest import check_pages
 from tests.test_inventory import create_from_file
@@ -49,3 +53,109 @@ def test_create_logs(user_client):
         app.log("warning", str(i))
         Session.commit()
     assert len(fetch_all("changelog")) == number_of_logs + 10
+
+
+def test_syslog_event_matching(user_client):
+    create_from_file(user_client, "europe.xls")
+    service = fetch("service", scoped_name="Start")
+    device = fetch("device", name="router5")
+    for name, source, content, regex in (
+        ("link_down", "router5", "link down", False),
+        ("interface", "", r"Gi\d+/\d+ (up|down)", True),
+    ):
+        factory(
+            "event",
+            name=name,
+            log_source=source,
+            log_content=content,
+            log_content_regex=regex,
+            service=service.id,
+        )
+    Session.commit()
+    dispatched = []
+    server = SyslogServer(
+        "127.0.0.1", 0, 10, 2, dispatched.append, app.cache_generations
+    )
+    server.start()
+    for message in (b"link down", b"unrelated"):
+        server.enqueue("127.0.0.1", message)
+    with socket(AF_INET, SOCK_DGRAM) as client:
+        client.sendto(b"Gi0/1 up", server.server.server_address)
+    for _ in range(100):
+        if dispatched:
+            break
+        sleep(0.05)
+    server.queue.join()
+    server.server.shutdown()
+    assert dispatched == [service.id]
+    assert not server.matcher.match(device.ip_address, "link up")
+    assert server.matcher.match(device.ip_address, "Gi0/2 down link down") == [
+        service.id,
+        service.id,
+    ]
+    factory(
+        "event",
+        name="repeated_word",
+        log_content=r"(\w+) \1 again",
+        log_content_regex=True,
+        service=service.id,
+    )
+    Session.commit()
+    assert server.matcher.match(device.ip_address, "flap flap again") == [service.id]
+
+
+def test_batch_writer_failures(user_client):
+    writer = BatchWriter("log", 100, 3600, max_failures=2)
+    writer.add(time="2020-01-01 00:00:00", source="router5", content="first")
+    writer.flush()
+    log_id = fetch("log", content="first").id
+    writer.add(id=log_id, time="2020-01-01 00:00:01", content="duplicate")
+    writer.add(time="2020-01-01 00:00:02", source="router5", content="second")
+    for _ in range(2):
+        try:
+            writer.flush()
+        except Exception:
+            pass
+        assert len(writer.rows) == 2
+    writer.flush()
+    assert not writer.rows and fetch("log", allow_none=True, content="second")
+    assert not fetch("log", allow_none=True, content="duplicate")
+
+
+def test_syslog_storage(user_client):
+    create_from_file(user_client, "europe.xls")
+    device, writer = fetch("device", name="router5"), BatchWriter("log", 2, 1)
+    server = SyslogServer("127.0.0.1", 0, 10, 1, None, app.cache_generations, writer)
+    server.start()
+    for index in range(5):
+        server.enqueue(device.ip_address, f"message {index}".encode("utf-8"))
+    server.enqueue("10.0.0.1", b"other device")
+    server.queue.join()
+    server.server.shutdown()
+    writer.flush()
+    logs = app.get_device_logs(device.id, page_size=3)
+    assert [line.split()[-1] for line in logs["logs"].split("\n")] == ["4", "3", "2"]
+    logs = app.get_device_logs(
+        device.id, page_size=3, end=logs["end"], end_id=logs["end_id"]
+    )
+    assert [line.split()[-1] for line in logs["logs"].split("\n")] == ["1", "0"]
+    assert logs["end"] is None
+    logs = app.get_device_logs(device.id, search="message 3")
+    assert logs["logs"].endswith("message 3") and "\n" not in logs["logs"]
+    device = fetch("device", name="router6")
+    for index in range(5):
+        factory(
+            "log",
+            time="2020-01-01 00:00:00",
+            source=device.ip_address,
+            content=f"batch {index}",
+        )
+    Session.commit()
+    pages, cursor = [], {}
+    while True:
+        logs = app.get_device_logs(device.id, page_size=2, **cursor)
+        pages.append([line.split()[-1] for line in logs["logs"].split("\n")])
+        if not logs["end"]:
+            break
+        cursor = {"end": logs["end"], "end_id": logs["end_id"]}
+    assert pages == [["4", "3"], ["2", "1"], ["0"]]
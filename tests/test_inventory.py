@@ -1,6 +1,11 @@
+from csv import reader
+from io import BytesIO, StringIO
 from werkzeug.datastructures import ImmutableMultiDict
+from xlwt import Workbook
+from zipfile import ZipFile
 
 from eNMS import app
+from eNMS.database import Session
 from eNMS.database.functions import delete_all, fetch, fetch_all
 from eNMS.properties.objects import (
     device_icons,
@@ -80,6 +85,56 @@ def test_object_creation_type(user_client):
     assert len(fetch_all("link")) == 0
 
 
+def test_bulk_topology_import(user_client):
+    create_from_file(user_client, "europe.xls")
+    book, rows = Workbook(), {
+        "device": [("name", "ip_address"), ("router5", "10.0.0.5"), ("new", "1.1.1.1")],
+        "link": [
+            ("name", "source_name", "destination_name"),
+            ("new_link", "new", "router5"),
+            ("invalid_link", "new", "missing"),
+        ],
+    }
+    for obj_type, sheet_rows in rows.items():
+        sheet = book.add_sheet(obj_type)
+        for row_index, row in enumerate(sheet_rows):
+            for column_index, value in enumerate(row):
+                sheet.write(row_index, column_index, value)
+    file = BytesIO()
+    book.save(file)
+    file.seek(0)
+    assert app.topology_import(file) == "Partial import (see logs)."
+    assert fetch("device", name="router5").ip_address == "10.0.0.5"
+    assert len(fetch_all("device")) == 34 and len(fetch_all("link")) == 50
+    link = fetch("link", name="new_link")
+    assert (link.source_name, link.destination_name) == ("new", "router5")
+    assert not fetch("link", allow_none=True, name="invalid_link")
+    pool = fetch("pool", name="All objects")
+    assert pool.device_number == 34 and pool.link_number == 50
+
+
+def test_topology_export(user_client):
+    create_from_file(user_client, "europe.xls")
+    extension, data = app.stream_topology("csv", ["link"])
+    rows = list(reader(StringIO(b"".join(data).decode("utf-8"))))
+    assert extension == "csv" and len(rows) == 50
+    assert rows[1][rows[0].index("source_name")] == "router30"
+    extension, data = app.stream_topology("csv")
+    with ZipFile(BytesIO(b"".join(data))) as archive:
+        assert extension == "zip" and archive.namelist() == ["device.csv", "link.csv"]
+        assert len(archive.read("device.csv").decode("utf-8").splitlines()) == 34
+    extension, data = app.stream_topology("xlsx")
+    with ZipFile(BytesIO(b"".join(data))) as archive:
+        sheet = archive.read("xl/worksheets/sheet2.xml").decode("utf-8")
+        assert sheet.count("<row>") == 50 and "router30" in sheet
+    app.export_topology(export_filename="topology_export_test")
+    path = app.path / "files" / "spreadsheets" / "topology_export_test.xls"
+    with open(path, "rb") as file:
+        assert app.topology_import(file) == "Topology successfully imported."
+    path.unlink()
+    assert len(fetch_all("device")) == 33 and len(fetch_all("link")) == 49
+
+
 routers = ["router" + str(i) for i in range(5, 20)]
 links = ["link" + str(i) for i in range(4, 15)]
 
@@ -148,3 +203,201 @@ def test_pool_management(user_client):
     user_client.post(f"/delete_instance/pool/{p1.id}")
     user_client.post(f"/delete_instance/pool/{p2.id}")
     assert len(fetch_all("pool")) == 7
+
+
+def test_pool_membership_update(user_client):
+    create_from_file(user_client, "europe.xls")
+    user_client.post("/update/pool", data=create_pool(pool1))
+    pool = fetch("pool", name="pool1")
+    device = next(device for device in pool.devices if device.location == "france")
+    device.update(location="germany")
+    assert device not in pool.devices and pool.device_number == 20
+    device.update(location="spain")
+    assert device in pool.devices and pool.device_number == 21
+
+
+def test_pool_configuration_matching(user_client):
+    create_from_file(user_client, "europe.xls")
+    for index, device in enumerate(fetch_all("device")[:3]):
+        device.configuration = f"hostname r{index}\nsnmp 50%_community"
+    for name, value, match in (
+        ("inclusion", "50%_comm", "inclusion"),
+        ("regex", "hostname r[01]$", "regex"),
+    ):
+        pool = {
+            "form_type": "pool",
+            "name": name,
+            "operator": "all",
+            "device_configuration": value,
+            "device_configuration_match": match,
+        }
+        user_client.post("/update/pool", data=create_pool(pool))
+    assert fetch("pool", name="inclusion").device_number == 3
+    assert fetch("pool", name="regex").device_number == 0
+    fetch("pool", name="regex").update(device_configuration="(?m)hostname r[01]$")
+    assert fetch("pool", name="regex").device_number == 2
+    assert "configuration" not in fetch_all("device")[-1].__dict__
+
+
+def test_pool_configuration_case_and_null(user_client):
+    create_from_file(user_client, "europe.xls")
+    devices = fetch_all("device")
+    devices[0].configuration = "HOSTNAME r0"
+    devices[1].configuration = "hostname r1"
+    devices[2].configuration = None
+    for name, value, match in (
+        ("case", "hostname", "inclusion"),
+        ("null", "None", "equality"),
+    ):
+        pool = {
+            "form_type": "pool",
+            "name": name,
+            "operator": "all",
+            "device_configuration": value,
+            "device_configuration_match": match,
+        }
+        user_client.post("/update/pool", data=create_pool(pool))
+    assert set(fetch("pool", name="case").devices) == {devices[1]}
+    null_devices = fetch("pool", name="null").devices
+    assert devices[0] not in null_devices and devices[2] in null_devices
+    devices[0].update(configuration="hostname r0")
+    devices[2].update(configuration="HOSTNAME r2")
+    assert set(fetch("pool", name="case").devices) == {devices[0], devices[1]}
+    assert devices[2] not in fetch("pool", name="null").devices
+    devices[2].update(configuration=None)
+    assert devices[2] in fetch("pool", name="null").devices
+    fetch("pool", name="null").compute_pool()
+    assert devices[2] in fetch("pool", name="null").devices
+
+
+def test_table_filtering_pagination(user_client):
+    create_from_file(user_client, "europe.xls")
+
+    def get_page(start, direction, column=0):
+        response = user_client.post(
+            "/table_filtering/device",
+            json={
+                "draw": 1,
+                "start": start,
+                "length": 10,
+                "order": [{"column": column, "dir": direction}],
+                "form": {"location": "i"},
+            },
+        )
+        return response.json
+
+    for direction in ("asc", "desc"):
+        pages = [get_page(start, direction) for start in range(0, 40, 10)]
+        names = [row[0] for page in pages for row in page["data"]]
+        devices = sorted(
+            device.name for device in fetch_all("device") if "i" in device.location
+        )
+        assert names == (devices if direction == "asc" else devices[::-1])
+        assert pages[0]["recordsFiltered"] == len(devices)
+        assert pages[0]["recordsTotal"] == len(fetch_all("device"))
+    Session.execute(
+        "UPDATE object SET description = NULL, location = 'Oslo' "
+        "WHERE type = 'device' AND id % 3 = 0"
+    )
+    Session.commit()
+    devices = [d for d in fetch_all("device") if "i" in d.location]
+    for direction in ("asc", "desc"):
+        pages = [get_page(start, direction, 1) for start in range(0, 40, 10)]
+        assert pages[0]["recordsFiltered"] == len(devices)
+        names = [row[0] for page in pages for row in page["data"]]
+        ordered = sorted(
+            devices, key=lambda d: (d.description is not None, d.description, d.id)
+        )
+        ordered = ordered if direction == "asc" else ordered[::-1]
+        assert names == [device.name for device in ordered]
+
+
+def test_shared_cache_invalidation(user_client):
+    create_from_file(user_client, "europe.xls")
+    generation = app.run_store.value("cache_generations", ("pool_index",), 0)
+    pool = create_pool({"form_type": "pool", "name": "shared", "operator": "all"})
+    user_client.post("/update/pool", data=pool)
+    assert app.run_store.value("cache_generations", ("pool_index",)) > generation
+    index = app.pool_index.get_index("device")
+    assert app.pool_index.get_index("device") is index
+    app.cache_generations.invalidate(("pool_index",))
+    assert app.pool_index.get_index("device") is not index
+
+    def count_devices():
+        response = user_client.post(
+            "/table_filtering/device",
+            json={
+                "draw": 1,
+                "start": 0,
+                "length": 10,
+                "order": [{"column": 0, "dir": "asc"}],
+                "form": {},
+            },
+        )
+        return response.json["recordsTotal"]
+
+    assert count_devices() == len(fetch_all("device"))
+    app.table_counts["device"][None] = 0
+    assert count_devices() == 0
+    app.cache_generations.invalidate(("table", "device"))
+    assert count_devices() == len(fetch_all("device"))
+
+    def generations():
+        return [
+            app.run_store.value("cache_generations", ("table", table), 0)
+            for table in ("device", "link")
+        ]
+
+    device_generation, link_generation = generations()
+    fetch_all("device")[0].os_version = "changed"
+    Session.commit()
+    assert generations() == [device_generation + 1, link_generation]
+
+
+def test_configuration_history(user_client):
+    create_from_file(user_client, "europe.xls")
+    history, (device, other) = app.configuration_history, fetch_all("device")[:2]
+    base = "".join(f"interface Ethernet{index}\n shutdown\n" for index in range(500))
+    versions = [base, base.replace("Ethernet42\n", "Ethernet42\n mtu 9000\n"), base]
+    for index, configuration in enumerate(versions):
+        runtime = f"2020-01-0{index + 1} 00:00:00"
+        assert history.store(device, "configuration", configuration, runtime)
+        assert not history.store(device, "configuration", configuration, runtime)
+    assert history.store(other, "configuration", versions[1], "2020-01-02 12:00:00")
+    assert len(fetch_all("configuration_blob")) == 2
+    blob = fetch("configuration_blob", hash=history.digest(versions[1]))
+    assert blob.depth == 1 and len(blob.delta) == 3
+    third, second, first = history.history(device.id, "configuration")
+    assert history.text(second["hash"]) == versions[1]
+    comparison = history.compare(first["id"], second["id"])
+    assert [opcode[0] for opcode in comparison["opcodes"]] == [
+        "equal",
+        "insert",
+        "equal",
+    ]
+    assert app.get_changed_devices("2020-01-02") == sorted([device.name, other.name])
+    history.create_blob(history.digest(base), base, None)
+    assert history.store(other, "configuration", base, "2020-01-04 00:00:00")
+    assert len(fetch_all("configuration_blob")) == 2
+
+
+def test_inventory_sync(user_client):
+    create_from_file(user_client, "europe.xls")
+    devices = [
+        {"name": "router5", "ip_address": "10.0.0.5", "longitude": None},
+        {"name": "router6", "ip_address": fetch("device", name="router6").ip_address},
+        {"name": "new", "ip_address": "1.1.1.1", "location": "Paris"},
+        {"name": fetch_all("link")[0].name, "ip_address": "2.2.2.2"},
+    ]
+    librenms = app.inventory_sync.librenms
+    app.inventory_sync.librenms = lambda address: iter(devices)
+    try:
+        assert app.query_librenms() == {"devices created": 1, "devices updated": 1}
+        assert app.query_librenms() == {}
+    finally:
+        app.inventory_sync.librenms = librenms
+    router = fetch("device", name="router5")
+    assert router.ip_address == "10.0.0.5" and router.longitude != "None"
+    assert fetch("device", name="new").location == "Paris"
+    assert len(fetch_all("device")) == 34
+    assert fetch("pool", name="All objects").device_number == 34